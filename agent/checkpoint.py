@@ -14,75 +14,494 @@
 #   - Minimal dependencies (just stdlib).
 #
 # LIMITATIONS:
-#   - Entire state snapshot stored each line (simple, but can grow large).
-#   - No compaction / GC (you can add a periodic "squash" if needed).
-#   - Not concurrency-safe (single-process POC).
+#   - Full snapshots only every CKPT_BASE_EVERY records; in between, records hold
+#     just the top-level keys that changed (readers replay from the last base).
+#   - Compaction (compact) keeps only the newest snapshot(s) per node; older
+#     history moves to .archive/ and is no longer reachable by rollback.
+#   - Sidecar history.idx (id, byte offset, node, ts, base flag per record)
+#     makes time_travel / rollback lookups a seek instead of a full parse.
+#   - Single-process only (appends are serialized by an in-process lock).
+#   - submit() hands a record to a single background writer thread (FIFO), so
+#     async streams never block on disk; append() and the readers flush
+#     pending submits first, so ordering and visibility are unchanged. The
+#     first failed background write is re-raised by the next flush()/close().
+#
+#   - Archived segments are compressed (zstd if installed, else gzip); the
+#     live log stays plain JSONL so tail reads remain a single seek.
 #
 # EXTENSIONS (ideas):
-#   - Add compression (gzip) for large histories.
 #   - Shard by session id (if multi-user).
-#   - Add indexing (by node name, timestamp range).
+#   - Query the index by node name / timestamp range.
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-import json, time, uuid
+import atexit, bisect, gzip, io, json, os, shutil, threading, time, uuid, weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Iterable
 from .state import GraphState
 
+try:
+    import orjson  # optional: C/Rust (de)serializer, several x faster than stdlib json
+except Exception:
+    orjson = None
+
+try:
+    import zstandard  # optional: faster + better ratio than gzip for archived segments
+except Exception:
+    zstandard = None
+
+_loads = orjson.loads if orjson else json.loads
+
+# Open stores per resolved path; one atexit hook per path closes (drains) them.
+_STORES: Dict[Path, "weakref.WeakSet"] = {}
+_STORES_LOCK = threading.Lock()
+
+def _close_stores(key: Path):
+    for store in list(_STORES.get(key, ())):
+        store.close()
+
+def _dumps(obj: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj).encode("utf-8")
+
+def _encode_record(header: Dict[str, Any], field: str, parts: Dict[str, bytes]) -> bytes:
+    # Splice pre-encoded state values into the record (no second encode pass).
+    body = b",".join(_dumps(k) + b":" + v for k, v in parts.items())
+    return _dumps(header)[:-1] + b"," + _dumps(field) + b":{" + body + b"}}\n"
+
+def _materialize(records: Iterable[Dict[str, Any]], state: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    # Replay delta records onto the preceding base (or `state`) so every
+    # yielded record carries a full "state" again. Deltas with no base before
+    # them (only possible in a hand-edited log) are skipped.
+    for r in records:
+        if "patch" in r:
+            if state is None:
+                continue
+            state = {**state, **r.pop("patch")}
+            for k in r.pop("drop", ()):
+                state.pop(k, None)
+            r["state"] = state
+        else:
+            state = r["state"]
+        yield r
+
+# Initial tail window for latest_state / recent rollback (doubled until a full
+# record fits). Keeps "read the newest snapshot" O(record size), not O(file size).
+TAIL_WINDOW = 64 * 1024
+
+# Auto-compact once the live log exceeds this many bytes. Opt-in (0 = off, the
+# default): compaction drops rollback / time_travel targets older than the kept records.
+CKPT_COMPACT_BYTES = int(os.getenv("CKPT_COMPACT_BYTES", "0"))
+CKPT_COMPACT_KEEP = int(os.getenv("CKPT_COMPACT_KEEP", "1"))
+CKPT_ARCHIVE = os.getenv("CKPT_ARCHIVE", "1") == "1"
+# Write a full snapshot every N records (1 = always full, i.e. no deltas).
+CKPT_BASE_EVERY = max(1, int(os.getenv("CKPT_BASE_EVERY", "20")))
+
 class JSONCheckpointStore:
     """
     Simple JSONL store.
 
     FILE FORMAT (history.jsonl):
-      {"id": "...", "ts": <float epoch>, "node": "<node_name>", "state": {...}}
-      {"id": "...", "ts": <float epoch>, "node": "<node_name>", "state": {...}}
+      {"id": "...", "ts": <float epoch>, "node": "<node_name>", "base": true, "state": {...}}
+      {"id": "...", "ts": <float epoch>, "node": "<node_name>", "drop": [...], "patch": {...}}
       ...
 
-    Each record is a COMPLETE state snapshot after a node finishes (post-reducer).
+    "base" records hold a COMPLETE state snapshot after a node finishes
+    (post-reducer); records without "base" but with "state" (older logs) are
+    bases too. "patch" records hold only top-level keys whose value changed
+    since the previous record ("drop" lists removed keys). Readers
+    (iter_records, latest_state, ...) always return full states.
     """
 
     def __init__(self, path: str = ".agent_ckpts"):
         self.base = Path(path)
         self.base.mkdir(parents=True, exist_ok=True)
         self.file = self.base / "history.jsonl"
+        self.idx_file = self.base / "history.idx"
+        self._fh = None  # persistent append handle (opened on first append)
+        self._ix = None  # persistent index append handle
+        # Encoded values of the last written state; None forces a base record
+        # (fresh process, after compaction / rollback).
+        self._last_enc: Optional[Dict[str, bytes]] = None
+        self._since_base = 0
+        self._lock = threading.Lock()
+        # In-memory index: position -> (id, offset, node, ts, base); id -> position;
+        # positions of base records (ascending, for bisect).
+        self._entries: List[Tuple[str, int, str, float, bool]] = []
+        self._ids: Dict[str, int] = {}
+        self._bases: List[int] = []
+        # Background writer for submit(): one worker keeps records in order.
+        # _pending holds every not-yet-awaited future; _error the first write failure.
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Future] = []
+        self._error: Optional[BaseException] = None
+        self._load_index()
+        key = self.base.resolve()
+        with _STORES_LOCK:
+            if key not in _STORES:
+                _STORES[key] = weakref.WeakSet()
+                atexit.register(_close_stores, key)
+            _STORES[key].add(self)
+
+    # ------------------------------------------------------------------
+    # close: drain pending submits and release the append handles (safe to
+    # call repeatedly; the next append reopens them). Re-raises the first
+    # failed background write, after the handles are released.
+    # ------------------------------------------------------------------
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._close_handles()
+
+    def _close_handles(self):
+        for fh in (self._fh, self._ix):
+            if fh is not None:
+                fh.close()
+        self._fh = self._ix = None
+
+    # ------------------------------------------------------------------
+    # Index maintenance.
+    #   history.idx line: id \t offset \t node \t ts \t base(0/1)
+    #   _load_index trusts the sidecar only if its last entry points at the
+    #   last line of the log; otherwise (missing, torn write, older log)
+    #   it is rebuilt with one scan. An undecodable final log line (torn by a
+    #   crash mid-write) is cut off first, so the partial record is ignored
+    #   and the next append starts on a clean line.
+    # ------------------------------------------------------------------
+    def _index_add(self, rid: str, offset: int, node: str, ts: float, base: bool):
+        pos = len(self._entries)
+        self._entries.append((rid, offset, node, ts, base))
+        self._ids[rid] = pos
+        if base:
+            self._bases.append(pos)
+
+    def _drop_torn_tail(self):
+        lines, _ = self._tail()
+        if not lines:
+            return
+        start, _, raw = lines[-1]
+        try:
+            _loads(raw)
+        except ValueError:
+            os.truncate(self.file, start)
+
+    def _load_index(self):
+        self._drop_torn_tail()
+        self._entries, self._ids, self._bases = [], {}, []
+        size = self.file.stat().st_size if self.file.exists() else 0
+        if self.idx_file.exists():
+            with self.idx_file.open("r", encoding="utf-8") as f:
+                for l in f:
+                    parts = l.rstrip("\n").split("\t")
+                    if len(parts) != 5:
+                        break
+                    self._index_add(parts[0], int(parts[1]), parts[2], float(parts[3]), parts[4] == "1")
+        if self._entries:
+            rid, offset = self._entries[-1][:2]
+            with self.file.open("rb") as f:
+                f.seek(offset)
+                raw = f.readline()
+            ok = offset + len(raw) == size and raw.strip() and _loads(raw).get("id") == rid
+        else:
+            ok = size == 0
+        if not ok:
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        if self._ix is not None:
+            self._ix.close()
+            self._ix = None
+        self._entries, self._ids, self._bases = [], {}, []
+        if self.file.exists():
+            offset = 0
+            with self.file.open("rb", buffering=1 << 20) as f:
+                for l in f:
+                    if l.strip():
+                        r = _loads(l)
+                        self._index_add(r.get("id", ""), offset, r.get("node", ""), r.get("ts", 0.0), "patch" not in r)
+                    offset += len(l)
+        with self.idx_file.open("w", encoding="utf-8") as f:
+            f.writelines(self._index_line(*e) for e in self._entries)
+
+    @staticmethod
+    def _index_line(rid: str, offset: int, node: str, ts: float, base: bool) -> str:
+        node = str(node).replace("\t", " ").replace("\n", " ")
+        return f"{rid}\t{offset}\t{node}\t{ts!r}\t{int(base)}\n"
+
+    # ------------------------------------------------------------------
+    # _read_at: materialized record at index position `pos`.
+    #   Seeks to the nearest base at/before pos and replays forward.
+    # ------------------------------------------------------------------
+    def _read_at(self, pos: int) -> Optional[Dict[str, Any]]:
+        i = bisect.bisect_right(self._bases, pos) - 1
+        if i < 0:
+            return None
+        b = self._bases[i]
+        recs = []
+        with self.file.open("rb") as f:
+            f.seek(self._entries[b][1])
+            while len(recs) < pos - b + 1:
+                l = f.readline()
+                if not l:
+                    break
+                if l.strip():
+                    recs.append(_loads(l))
+        out = None
+        for out in _materialize(recs):
+            pass
+        return out
 
     # ------------------------------------------------------------------
     # append: persist a new snapshot generated post-node execution.
+    #   Values are encoded per top-level key and compared as bytes with the
+    #   previous record, so only changed keys are written (and in-place
+    #   mutation of the caller's state after append cannot skew the diff).
     # Returns generated checkpoint id (UUID4 hex short).
+    #
+    # append: synchronous write (after any pending submits).
+    # submit: non-blocking; encodes the state on the caller side (the snapshot
+    #         point) and queues the write for the background writer. Returns a
+    #         Future resolving to the id. Intended for async streams.
+    # flush:  wait until every submitted record is on disk; raises the first
+    #         background write error (once).
     # ------------------------------------------------------------------
     def append(self, state: GraphState, node: str):
-        rec = {
-            "id": uuid.uuid4().hex,
-            "ts": time.time(),
-            "node": node,
-            "state": state
-        }
-        with self.file.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(rec) + "\n")
-        return rec["id"]
+        self.flush()
+        return self._write(self._encode(state), node)
+
+    def submit(self, state: GraphState, node: str) -> Future:
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ckpt-writer")
+        # Encode on the caller side: this is the snapshot point, so later changes to
+        # the caller's state dict never leak into the record.
+        enc = self._encode(state)
+        fut = self._writer.submit(self._write, enc, node)
+        # Drop finished futures (keeping their first error) so the list stays short.
+        done = [f for f in self._pending if f.done()]
+        self._reap(done)
+        self._pending = [f for f in self._pending if f not in done] + [fut]
+        return fut
+
+    def _reap(self, done: List[Future]):
+        for fut in done:
+            try:
+                fut.result()
+            except BaseException as e:
+                if self._error is None:
+                    self._error = e
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self._reap(pending)
+        err, self._error = self._error, None
+        if err is not None:
+            raise err
+
+    @staticmethod
+    def _encode(state: GraphState) -> Dict[str, bytes]:
+        return {k: _dumps(v) for k, v in state.items()}
+
+    def _write(self, enc: Dict[str, bytes], node: str):
+        header: Dict[str, Any] = {"id": uuid.uuid4().hex, "ts": time.time(), "node": node}
+        with self._lock:
+            last = self._last_enc
+            if last is None or self._since_base >= CKPT_BASE_EVERY - 1:
+                header["base"] = True
+                line = _encode_record(header, "state", enc)
+                self._since_base = 0
+            else:
+                drop = [k for k in last if k not in enc]
+                if drop:
+                    header["drop"] = drop
+                line = _encode_record(header, "patch", {k: v for k, v in enc.items() if last.get(k) != v})
+                self._since_base += 1
+            self._last_enc = enc
+            if self._fh is None:
+                self._fh = self.file.open("ab", buffering=1 << 16)
+                self._ix = self.idx_file.open("a", encoding="utf-8")
+            offset = self._fh.tell()
+            self._fh.write(line)
+            # Flush (no fsync) so readers opening their own handle see it.
+            self._fh.flush()
+            entry = (header["id"], offset, node, header["ts"], "base" in header)
+            self._index_add(*entry)
+            self._ix.write(self._index_line(*entry))
+            self._ix.flush()
+            if CKPT_COMPACT_BYTES and self._fh.tell() > CKPT_COMPACT_BYTES:
+                self._compact_locked(CKPT_COMPACT_KEEP, CKPT_ARCHIVE)
+        return header["id"]
+
+    # ------------------------------------------------------------------
+    # compact: squash the log to the newest `keep_last_n` records per node.
+    #   - Streams the log once; kept base lines are copied verbatim, kept
+    #     deltas are re-encoded as bases (their predecessors are dropped).
+    #   - Relative order of kept records is preserved.
+    #   - Writes history.jsonl.tmp then os.replace (atomic swap).
+    #   - archive=True compresses the pre-compaction log into .archive/.
+    # Returns number of records kept.
+    # ------------------------------------------------------------------
+    def compact(self, keep_last_n: int = 1, archive: bool = True) -> int:
+        self.flush()
+        with self._lock:
+            return self._compact_locked(keep_last_n, archive)
+
+    def _compact_locked(self, keep_last_n: int, archive: bool) -> int:
+        if not self.file.exists():
+            return 0
+        self._close_handles()
+        self._last_enc = None
+        # node -> [(seq, raw base line | None, materialized record)]
+        latest: Dict[str, List[Tuple[int, Optional[bytes], Dict[str, Any]]]] = {}
+        with self.file.open("rb", buffering=1 << 20) as f:
+            state = None
+            for seq, l in enumerate(f):
+                if not l.strip():
+                    continue
+                rec = _loads(l)
+                raw = None if "patch" in rec else (l if l.endswith(b"\n") else l + b"\n")
+                for rec in _materialize([rec], state):
+                    state = rec["state"]
+                    bucket = latest.setdefault(rec.get("node", ""), [])
+                    bucket.append((seq, raw, rec))
+                    if len(bucket) > keep_last_n:
+                        bucket.pop(0)
+        kept = sorted((r for b in latest.values() for r in b), key=lambda r: r[0])
+        tmp = self.file.with_name(self.file.name + ".tmp")
+        with tmp.open("wb") as f:
+            for _, raw, rec in kept:
+                if raw is None:
+                    header = {"id": rec["id"], "ts": rec["ts"], "node": rec["node"], "base": True}
+                    raw = _encode_record(header, "state", {k: _dumps(v) for k, v in rec["state"].items()})
+                f.write(raw)
+        if archive:
+            self._archive(self.file)
+        os.replace(tmp, self.file)
+        self._rebuild_index()
+        return len(kept)
 
     # ------------------------------------------------------------------
-    # load_all: read full history (for small POC it's fine).
-    # For large logs you'd stream / iterate instead.
+    # _archive: stream-compress a log segment into .archive/.
+    #   history-<ms>.jsonl.zst (zstandard) or history-<ms>.jsonl.gz.
+    # ------------------------------------------------------------------
+    def _archive(self, src: Path) -> Path:
+        arch = self.base / ".archive"
+        arch.mkdir(exist_ok=True)
+        stem = f"history-{int(time.time() * 1000)}.jsonl"
+        with src.open("rb") as fi:
+            if zstandard:
+                dst = arch / (stem + ".zst")
+                with dst.open("wb") as fo:
+                    zstandard.ZstdCompressor(level=3).copy_stream(fi, fo)
+            else:
+                dst = arch / (stem + ".gz")
+                with gzip.open(dst, "wb", compresslevel=6) as fo:
+                    shutil.copyfileobj(fi, fo, 1 << 20)
+        return dst
+
+    # ------------------------------------------------------------------
+    # iter_archive: stream records from archived segments (oldest first).
+    #   Decompression is streaming; memory stays at one record.
+    # ------------------------------------------------------------------
+    def iter_archive(self) -> Iterator[Dict[str, Any]]:
+        arch = self.base / ".archive"
+        if not arch.exists():
+            return
+        for p in sorted(arch.glob("history-*.jsonl*")):
+            if p.suffix == ".zst":
+                if zstandard is None:
+                    raise RuntimeError(f"zstandard is required to read {p}")
+                raw = p.open("rb")
+                f = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw), 1 << 20)
+            elif p.suffix == ".gz":
+                raw = f = gzip.open(p, "rb")
+            else:
+                raw = f = p.open("rb")
+            with raw, f:
+                yield from _materialize(_loads(l) for l in f if l.strip())
+
+    # ------------------------------------------------------------------
+    # iter_records: stream-parse the log one line at a time.
+    #   Peak memory is a single record (no whole-file string / split list).
+    #   Deltas are replayed, so each record has a full "state".
+    # ------------------------------------------------------------------
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        self.flush()
+        if not self.file.exists():
+            return
+        with self.file.open("rb", buffering=1 << 20) as f:
+            yield from _materialize(_loads(l) for l in f if l.strip())
+
+    # ------------------------------------------------------------------
+    # load_all: materialize full history (prefer iter_records for scans).
     # ------------------------------------------------------------------
     def load_all(self) -> List[Dict[str, Any]]:
+        return list(self.iter_records())
+
+    # ------------------------------------------------------------------
+    # _tail: read only the trailing block of the log.
+    #   Seeks to EOF and reads a window, doubling it until at least one
+    #   complete record is inside (or the whole file is covered).
+    #   Returns ([(start_offset, end_offset, raw_line_bytes), ...], whole_file)
+    #   in file order; end_offset includes the trailing newline.
+    # ------------------------------------------------------------------
+    def _tail(self, window: int = TAIL_WINDOW) -> Tuple[List[Tuple[int, int, bytes]], bool]:
         if not self.file.exists():
-            return []
-        return [
-            json.loads(l)
-            for l in self.file.read_text(encoding="utf-8").splitlines()
-            if l.strip()
-        ]
+            return [], True
+        with self.file.open("rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            while True:
+                start = max(0, size - window)
+                f.seek(start)
+                buf = f.read(size - start)
+                if start == 0 or b"\n" in buf.rstrip(b"\n"):
+                    break
+                window *= 2
+        # First segment of a partial window may be a cut-off record: skip it.
+        pos = 0 if start == 0 else buf.index(b"\n") + 1
+        lines = []
+        while pos < len(buf):
+            end = buf.find(b"\n", pos)
+            if end == -1:
+                end = len(buf)
+            if buf[pos:end].strip():
+                lines.append((start + pos, min(start + end + 1, size), buf[pos:end]))
+            pos = end + 1
+        return lines, start == 0
+
+    # ------------------------------------------------------------------
+    # _tail_records: trailing window replayed from its first base record.
+    #   Grows the window until it contains a base (or covers the file).
+    #   Returns ([(end_offset, record), ...], whole_file).
+    # ------------------------------------------------------------------
+    def _tail_records(self) -> Tuple[List[Tuple[int, Dict[str, Any]]], bool]:
+        window = TAIL_WINDOW
+        while True:
+            lines, whole_file = self._tail(window)
+            parsed = [(end, _loads(raw)) for _, end, raw in lines]
+            first = next((i for i, (_, r) in enumerate(parsed) if "patch" not in r), None)
+            if first is not None or whole_file:
+                break
+            window *= 4
+        if first is None:
+            return [], whole_file
+        parsed = parsed[first:]
+        return list(zip((end for end, _ in parsed), _materialize(r for _, r in parsed))), whole_file
 
     # ------------------------------------------------------------------
     # latest_state: convenience to pick final snapshot (tail).
+    #   Only the trailing window (back to the nearest base) is read.
     # Returns None if no snapshots.
     # ------------------------------------------------------------------
     def latest_state(self) -> Optional[GraphState]:
-        records = self.load_all()
-        if not records:
+        self.flush()
+        recs, _ = self._tail_records()
+        if not recs:
             return None
-        return records[-1]["state"]
+        return recs[-1][1]["state"]
 
     # ------------------------------------------------------------------
     # rollback: destructive operation.
@@ -90,34 +509,38 @@ class JSONCheckpointStore:
     #   - Returns state at that checkpoint (or None if not found).
     #
     # STRATEGY:
-    #   Iterate records until checkpoint found; rewrite file with that prefix.
+    #   Locate the id via the index, read its state from the nearest base,
+    #   then truncate the log at the next record's byte offset (one syscall,
+    #   no re-serialization) and trim the index to match.
     # ------------------------------------------------------------------
     def rollback(self, checkpoint_id: str) -> Optional[GraphState]:
-        records = self.load_all()
-        keep = []
-        rolling_state: Optional[GraphState] = None
-        found = False
-        for r in records:
-            keep.append(r)
-            if r["id"] == checkpoint_id:
-                found = True
-                rolling_state = r["state"]
-                break
-        if not found:
-            return None  # checkpoint id not present
-        with self.file.open("w", encoding="utf-8") as f:
-            for r in keep:
-                f.write(json.dumps(r) + "\n")
-        return rolling_state
+        self.flush()
+        with self._lock:
+            pos = self._ids.get(checkpoint_id)
+            if pos is None:
+                return None  # checkpoint id not present
+            r = self._read_at(pos)
+            if pos + 1 < len(self._entries):
+                self._close_handles()
+                os.truncate(self.file, self._entries[pos + 1][1])
+                for rid, *_ in self._entries[pos + 1:]:
+                    del self._ids[rid]
+                del self._entries[pos + 1:]
+                del self._bases[bisect.bisect_right(self._bases, pos):]
+                with self.idx_file.open("w", encoding="utf-8") as f:
+                    f.writelines(self._index_line(*e) for e in self._entries)
+            self._last_enc = None
+        return r["state"] if r else None
 
     # ------------------------------------------------------------------
     # time_travel: non-destructive read of a historical index.
     #   index=0 is earliest snapshot.
     #   Clamps out-of-range indices.
+    #   Uses the offset index: one seek + replay from the nearest base.
     # ------------------------------------------------------------------
     def time_travel(self, index: int) -> Optional[GraphState]:
-        records = self.load_all()
-        if not records:
+        self.flush()
+        if not self._entries:
             return None
-        index = max(0, min(index, len(records)-1))
-        return records[index]["state"]
\ No newline at end of file
+        r = self._read_at(max(0, min(index, len(self._entries) - 1)))
+        return r["state"] if r else None
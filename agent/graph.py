@@ -4,7 +4,7 @@
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
 from typing import AsyncIterator
-import os
+import asyncio, os
 from langgraph.graph import StateGraph, END
 
 try:
@@ -63,59 +63,86 @@ def _config():
     # Only supply thread_id if a checkpointer is active
     return {"configurable": {"thread_id": THREAD_ID}} if memory else {}
 
+# --------------------------------------------------------------------------------------
+# STREAM CHUNK EXTRACTION
+# --------------------------------------------------------------------------------------
+# Token events arrive in the thousands, so the per-event path avoids probing: the text
+# extractor for a chunk is resolved once per chunk type and cached, and subsequent
+# chunks of that type (e.g. AIMessageChunk) call it directly.
+# --------------------------------------------------------------------------------------
+_END_EVENTS = frozenset({"on_chain_end", "chain.end", "graph:node:end", "graph:step:end"})
+
+def _as_text(raw) -> str | None:
+    if isinstance(raw, (list, tuple)):
+        # Some providers emit list of parts; join them
+        raw = "".join(str(p) for p in raw)
+    return None if raw is None else str(raw)
+
+def _from_mapping(c) -> str | None:
+    return _as_text(c.get("content") or c.get("text"))
+
+def _from_content(c) -> str | None:
+    return _as_text(c.content or None)
+
+def _from_text(c) -> str | None:
+    raw = c.text
+    # Older message types expose text() as a method
+    if callable(raw):
+        try:
+            raw = raw()
+        except Exception:
+            raw = None
+    return _as_text(raw)
+
+def _no_text(c) -> None:
+    return None
+
+_EXTRACTORS: dict = {}
+
+def _extractor_for(c):
+    if isinstance(c, dict):
+        fn = _from_mapping
+    elif hasattr(c, "content"):
+        fn = _from_content
+    elif hasattr(c, "text"):
+        fn = _from_text
+    else:
+        fn = _no_text
+    _EXTRACTORS[type(c)] = fn
+    return fn
+
 async def run_agent_stream(user_input: str) -> AsyncIterator[str]:
     initial: GraphState = {"user_input": user_input}
     yielded_any = False
     final_answer = None
+    extractors = _EXTRACTORS
 
     async for event in graph.astream_events(initial, config=_config(), version="v1"):
         etype = event.get("type") or event.get("event")
         if not etype:
             continue
+        data = event.get("data") or {}
 
-        st = event.get("state") or event.get("data", {}).get("state")
+        st = event.get("state") or data.get("state")
         if st and isinstance(st, dict):
-            if etype in {"on_chain_end", "chain.end", "graph:node:end", "graph:step:end"}:
+            if etype in _END_EVENTS:
                 node = (
                     ",".join(event.get("tags", []))
                     or event.get("name")
                     or event.get("node_name")
                     or "node"
                 )
-                _ckpt.append(st, node=node)
+                # Queued to the store's writer thread; no disk I/O on the stream path.
+                _ckpt.submit(st, node=node)
             if "answer" in st:
                 final_answer = st["answer"]
 
-        data = event.get("data") or {}
-        chunk_text = None
-
-        if "chunk" in data:
-            c = data["chunk"]
-            raw = getattr(c, "content", None) or getattr(c, "text", None)
-            if raw is None and isinstance(c, dict):
-                raw = c.get("content") or c.get("text")
-            # If attribute is a method (callable), call it
-            if callable(raw):
-                try:
-                    raw = raw()
-                except Exception:
-                    raw = None
-            if isinstance(raw, (list, tuple)):
-                # Some providers emit list of parts; join them
-                raw = "".join(str(p) for p in raw)
-            if raw is not None:
-                chunk_text = str(raw)
-
-        elif "delta" in data and isinstance(data["delta"], dict):
-            d = data["delta"]
-            raw = d.get("content") or d.get("text")
-            if callable(raw):
-                try:
-                    raw = raw()
-                except Exception:
-                    raw = None
-            if raw is not None:
-                chunk_text = str(raw)
+        c = data.get("chunk")
+        if c is not None:
+            chunk_text = (extractors.get(type(c)) or _extractor_for(c))(c)
+        else:
+            d = data.get("delta")
+            chunk_text = _from_mapping(d) if isinstance(d, dict) else None
 
         if chunk_text:
             yielded_any = True
@@ -124,11 +151,15 @@ async def run_agent_stream(user_input: str) -> AsyncIterator[str]:
     if not yielded_any and final_answer:
         yield str(final_answer)
 
-def run_agent(user_input: str) -> GraphState:
-    final = graph.invoke({"user_input": user_input}, config=_config())
+async def arun_agent(user_input: str) -> GraphState:
+    final = await graph.ainvoke({"user_input": user_input}, config=_config())
     _ckpt.append(final, node="FINAL")
     return final
 
+def run_agent(user_input: str) -> GraphState:
+    # rag_retrieve / tool_shell are coroutine nodes, so the graph must run async.
+    return asyncio.run(arun_agent(user_input))
+
 def rollback_to(checkpoint_id: str):
     return _ckpt.rollback(checkpoint_id)
 
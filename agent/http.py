@@ -0,0 +1,92 @@
+# --------------------------------------------------------------------------------------
+# SHARED HTTP CLIENTS (tool_server calls)
+# --------------------------------------------------------------------------------------
+# PURPOSE:
+#   Reuse pooled keep-alive connections to TOOLS_URL instead of opening a new
+#   connection per node call.
+#     - session()      : process-wide requests.Session for sync callers.
+#     - async_client() : httpx.AsyncClient for async nodes (see below).
+#
+# RETRIES:
+#   The sync session retries connection failures (urllib3 Retry, default allowed
+#   methods), so a non-idempotent /shell POST is never replayed after it was sent.
+#
+# WHY PER EVENT LOOP?
+#   httpx.AsyncClient pools are bound to the loop they were first used on, and the
+#   sync entrypoints (run_multi) start a fresh loop per call via asyncio.run. One
+#   client per live loop keeps pooling within a run without "Event loop is closed"
+#   errors across runs; clients of finished loops are dropped with the loop.
+#
+# JSON:
+#   loads / dumps use orjson when installed (faster parse, fewer allocations for
+#   large retrieval bodies), stdlib json otherwise. Send bodies with
+#   content=dumps(payload), headers=JSON_HEADERS; parse with loads(r.content).
+#
+# HTTP/2:
+#   Enabled automatically when the optional 'h2' package is installed. It is
+#   negotiated via TLS ALPN, so it applies to https:// endpoints; plain http://
+#   stays on pooled HTTP/1.1 keep-alive connections.
+# --------------------------------------------------------------------------------------
+from __future__ import annotations
+import asyncio, importlib.util, json, weakref
+from typing import List
+import httpx
+import requests
+try:
+    import orjson  # optional: faster JSON encode / decode
+except Exception:
+    orjson = None
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+loads = orjson.loads if orjson else json.loads  # accepts bytes or str
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode("utf-8")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20,
+                       max_retries=Retry(total=2, backoff_factor=0.1))
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+def session() -> requests.Session:
+    return _session
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=60, http2=HTTP2, limits=LIMITS)
+        _async_clients[loop] = client
+    return client
+
+
+# --------------------------------------------------------------------------------------
+# post_lines: POST and collect result lines in one pass.
+#   Asks for NDJSON ({"raw": line} per line) and parses it as it streams, so the
+#   whole body is never held as one string + split list. Servers that answer with
+#   the classic {"result": "<lines>"} body are still handled. Blank lines dropped.
+# --------------------------------------------------------------------------------------
+NDJSON = "application/x-ndjson"
+
+async def post_lines(url: str, payload: dict, timeout: float = 60) -> List[str]:
+    async with async_client().stream("POST", url, content=dumps(payload), timeout=timeout,
+                                     headers={"Accept": NDJSON, **JSON_HEADERS}) as r:
+        if r.headers.get("content-type", "").startswith(NDJSON):
+            lines = []
+            async for l in r.aiter_lines():
+                if l:
+                    raw = loads(l).get("raw", "")
+                    if raw.strip():
+                        lines.append(raw)
+            return lines
+        txt = loads(await r.aread()).get("result", "")
+        return [l for l in txt.splitlines() if l.strip()]
@@ -0,0 +1,36 @@
+# --------------------------------------------------------------------------------------
+# SHARED CHAT MODEL (local Ollama)
+# --------------------------------------------------------------------------------------
+# PURPOSE:
+#   One process-wide ChatOllama client for every node (single + multi agent), so all
+#   calls share one HTTP connection pool to the Ollama endpoint instead of one per
+#   node module.
+#
+# KEEP-ALIVE:
+#   OLLAMA_KEEP_ALIVE (default 30m) keeps the model resident between requests, so
+#   consecutive nodes / runs do not pay the cold-load cost.
+#
+# CONTEXT / OUTPUT:
+#   OLLAMA_NUM_CTX optionally overrides the model's context window and
+#   OLLAMA_NUM_PREDICT caps generated tokens per call (unset = model defaults).
+#
+# USAGE:
+#   Import the client (`from ..llm import llm as _llm`); never construct ChatOllama
+#   in node modules, so there is exactly one client / pool per process.
+# --------------------------------------------------------------------------------------
+from __future__ import annotations
+import os
+from langchain_ollama import ChatOllama
+
+OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0")) or None
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "0")) or None
+
+llm = ChatOllama(
+    model=OLLAMA_CHAT_MODEL,
+    temperature=0,
+    keep_alive=OLLAMA_KEEP_ALIVE,
+    num_ctx=OLLAMA_NUM_CTX,
+    num_predict=OLLAMA_NUM_PREDICT,
+)
@@ -3,7 +3,7 @@
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
 from typing import AsyncIterator
-import os, re
+import asyncio, os
 from langgraph.graph import StateGraph, END
 try:
     from langgraph.checkpoint.memory import MemorySaver
@@ -48,13 +48,13 @@ memory = MemorySaver() if MemorySaver else None
 graph_multi = builder.compile(checkpointer=memory) if memory else builder.compile()
 _ckpt = JSONCheckpointStore(path=".agent_ckpts_multi")
 
-SAFE_INPUT_REGEX = re.compile(r'^[\s\S]{1,5000}$')
+MAX_INPUT_CHARS = 5000
 
-def _config():
-    return {"configurable": {"thread_id": MULTI_THREAD_ID}} if memory else {}
+def _config(thread_id: str | None = None):
+    return {"configurable": {"thread_id": thread_id or MULTI_THREAD_ID}} if memory else {}
 
 def _validate_input(user_input: str):
-    if not user_input or not SAFE_INPUT_REGEX.match(user_input):
+    if not user_input or len(user_input) > MAX_INPUT_CHARS:
         raise ValueError("Invalid input.")
     return user_input
 
@@ -66,7 +66,8 @@ async def run_multi_stream(user_input: str) -> AsyncIterator[str]:
         etype = evt.get("type") or evt.get("event")
         st = evt.get("state") or evt.get("data", {}).get("state")
         if st and etype in {"on_chain_end","graph:node:end"}:
-            _ckpt.append(st, node=";".join(evt.get("tags", [])) or evt.get("name") or "node")
+            # Queued to the store's writer thread; no disk I/O on the stream path.
+            _ckpt.submit(st, node=";".join(evt.get("tags", [])) or evt.get("name") or "node")
             if "reviewed_answer" in st:
                 final_answer = st["reviewed_answer"]
             elif st.get("answer"):
@@ -74,8 +75,13 @@ async def run_multi_stream(user_input: str) -> AsyncIterator[str]:
     if final_answer:
         yield final_answer
 
-def run_multi(user_input: str) -> MultiAgentState:
+async def arun_multi(user_input: str, thread_id: str | None = None) -> MultiAgentState:
+    # thread_id: isolate concurrent runs (each needs its own checkpointer thread).
     user_input = _validate_input(user_input)
-    final = graph_multi.invoke({"user_input": user_input}, config=_config())
+    final = await graph_multi.ainvoke({"user_input": user_input}, config=_config(thread_id))
     _ckpt.append(final, node="FINAL")
-    return final
\ No newline at end of file
+    return final
+
+def run_multi(user_input: str) -> MultiAgentState:
+    # researcher / tool_exec are coroutine nodes, so the graph must run async.
+    return asyncio.run(arun_multi(user_input))
\ No newline at end of file
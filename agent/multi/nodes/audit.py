@@ -1,6 +1,30 @@
 from __future__ import annotations
 from typing import Dict, Any
-import hashlib, json
+import hashlib, json, os
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    from blake3 import blake3  # optional: SIMD tree hash, much faster than sha256 on small payloads
+except Exception:
+    blake3 = None
+
+if blake3 is not None and os.getenv("AUDIT_HASH_SHA256", "0") != "1":
+    HASH_ALG, _hasher = "blake3", blake3
+else:
+    HASH_ALG, _hasher = "sha256", hashlib.sha256
+
+def _canonical(obj: Any) -> bytes:
+    # sha256 digests are only comparable with earlier runs if the hashed bytes
+    # are identical too, so sha256 keeps the original json.dumps encoding.
+    if HASH_ALG == "sha256":
+        return json.dumps(obj, sort_keys=True).encode()
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
 
 def _post_validate(state: Dict[str, Any]) -> Dict[str, Any]:
     answer = state.get("answer") or state.get("executor_answer") or ""
@@ -12,20 +36,22 @@ def _post_validate(state: Dict[str, Any]) -> Dict[str, Any]:
     return {"issues": issues, "valid": not issues}
 
 def audit_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    # Returns only the keys it sets (see governance_node).
     if state.get("halt"):
-        return state
+        return {}
     if state.get("dry_run"):
         # Skip execution path earlier; just passthrough
-        return state
+        return {}
     validation = _post_validate(state)
-    state["audit"] = validation
+    out: Dict[str, Any] = {"audit": validation}
     if not validation["valid"]:
         # Rollback side-effects (placeholder)
-        state["rolled_back"] = True
-        state["reviewed_answer"] = f"Response held for review. Issues: {validation['issues']}"
-        state["halt"] = "post_validation_fail"
+        out["rolled_back"] = True
+        out["reviewed_answer"] = f"Response held for review. Issues: {validation['issues']}"
+        out["halt"] = "post_validation_fail"
     else:
         # Stable hash for provenance
-        payload = json.dumps({"a": state.get("answer")}, sort_keys=True).encode()
-        state["content_hash"] = hashlib.sha256(payload).hexdigest()
-    return state
\ No newline at end of file
+        payload = _canonical({"a": state.get("answer")})
+        out["content_hash"] = _hasher(payload).hexdigest()
+        out["content_hash_alg"] = HASH_ALG
+    return out
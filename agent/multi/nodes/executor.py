@@ -7,11 +7,11 @@
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
 from ..state import MultiAgentState
-from langchain_ollama import ChatOllama
-import os
+from ...llm import llm as _llm, OLLAMA_CHAT_MODEL as MODEL
+import logging, os
 
-MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
-_llm = ChatOllama(model=MODEL, temperature=0)
+REDACT_EXECUTOR_PROMPT = os.getenv("REDACT_EXECUTOR_PROMPT", "0") == "1"
+log = logging.getLogger(__name__)
 
 def executor_node(state: MultiAgentState) -> MultiAgentState:
     q = state["user_input"]
@@ -22,9 +22,15 @@ def executor_node(state: MultiAgentState) -> MultiAgentState:
         )
     else:
         prompt = f"Provide a concise, structured answer:\nQuestion: {q}\nDraft:"
-    print('promt-executor', prompt)
+    # isEnabledFor guard: skip formatting large prompts when DEBUG is off.
+    if log.isEnabledFor(logging.DEBUG):
+        if REDACT_EXECUTOR_PROMPT:
+            log.debug("executor prompt len=%d (redacted)", len(prompt))
+        else:
+            log.debug("executor prompt=%s", prompt)
     resp = _llm.invoke(prompt)
-    print('answer-executor', resp)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("executor answer=%r", resp)
     return {
         "draft_answer": resp.content,
         "meta": {"executor_model": MODEL}
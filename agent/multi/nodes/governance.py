@@ -1,91 +1,112 @@
 from __future__ import annotations
-import os, re, time, threading
-from collections import deque
+import logging, os, re, time, threading
 from typing import Dict, Any
 
-_RATE_LOCK = threading.Lock()
-_REQUEST_TIMES = deque()  # simple in‑mem sliding window
+log = logging.getLogger(__name__)
 
 RATE_LIMIT_PER_MIN = int(os.getenv("RATE_LIMIT_PER_MIN", "30"))
+
+# Token bucket: capacity RATE_LIMIT_PER_MIN, refilled continuously at
+# RATE_LIMIT_PER_MIN/60 tokens per second (monotonic clock). O(1) per call.
+_RATE_LOCK = threading.Lock()
+_tokens = float(RATE_LIMIT_PER_MIN)
+_last_refill = time.monotonic()
 ENABLE_HITL = os.getenv("ENABLE_HITL", "1") == "1"
 DRY_RUN = os.getenv("DRY_RUN", "0") == "1"
 REQUIRE_MODERATION = os.getenv("REQUIRE_MODERATION", "1") == "1"
 ALLOWED_TOOLS = {t.strip() for t in os.getenv("ALLOWED_TOOLS", "search,code_exec,fetch").split(",") if t.strip()}
+HITL_APPROVAL_FILE = os.getenv("HITL_APPROVAL_FILE", ".hitl_approve")
+
+# Moderation stub terms, matched case-insensitively in one scan (no lowered copy).
+_MODERATION_TERMS = re.compile(r'terror|self-harm|bomb', re.IGNORECASE)
+
+# HITL approval cache: (mtime_ns, size) of the flag file -> parsed verdict.
+_hitl_cache = (None, False)
 
-PII_PATTERNS = [
-    (re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}'), "<email>"),
-    (re.compile(r'\b\d{3}[-.\s]?\d{2,4}[-.\s]?\d{4}\b'), "<phone>"),
-]
+# Single alternation (one scan of the input); group name doubles as the
+# replacement tag.
+PII_PATTERN = re.compile(
+    r'(?P<email>[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})'
+    r'|(?P<phone>\b\d{3}[-.\s]?\d{2,4}[-.\s]?\d{4}\b)'
+)
 
 def _moderate(text: str) -> Dict[str, Any]:
     # Stub moderation (extend with real provider)
-    flagged = any(k in text.lower() for k in ["terror", "self-harm", "bomb"])
+    flagged = _MODERATION_TERMS.search(text) is not None
     return {"flagged": flagged, "reason": "policy_term_detected" if flagged else None}
 
 def _redact(text: str) -> str:
-    for pat, repl in PII_PATTERNS:
-        text = pat.sub(repl, text)
-    return text
+    return PII_PATTERN.sub(lambda m: f"<{m.lastgroup}>", text)
 
 def _rate_limit():
-    now = time.time()
+    global _tokens, _last_refill
+    now = time.monotonic()
     with _RATE_LOCK:
-        while _REQUEST_TIMES and now - _REQUEST_TIMES[0] > 60:
-            _REQUEST_TIMES.popleft()
-        if len(_REQUEST_TIMES) >= RATE_LIMIT_PER_MIN:
+        _tokens = min(RATE_LIMIT_PER_MIN, _tokens + (now - _last_refill) * RATE_LIMIT_PER_MIN / 60.0)
+        _last_refill = now
+        if _tokens < 1:
             return False, RATE_LIMIT_PER_MIN
-        _REQUEST_TIMES.append(now)
+        _tokens -= 1
     return True, RATE_LIMIT_PER_MIN
 
 def _hitl_approval(state: Dict[str, Any]) -> bool:
-    # Simple HITL: look for file flag or console opt-out
-    flag_file = os.getenv("HITL_APPROVAL_FILE", ".hitl_approve")
-    if os.path.exists(flag_file):
-        with open(flag_file, "r", encoding="utf-8") as f:
+    # Simple HITL: look for file flag or console opt-out.
+    # One stat() per call; the file is only re-read when it changes.
+    global _hitl_cache
+    try:
+        st = os.stat(HITL_APPROVAL_FILE)
+    except FileNotFoundError:
+        # Non-interactive default deny until file provided
+        return True
+    key = (st.st_mtime_ns, st.st_size)
+    if _hitl_cache[0] != key:
+        with open(HITL_APPROVAL_FILE, "r", encoding="utf-8") as f:
             content = f.read().strip().lower()
-        return content in {"y","yes","approve","approved"}
-    # Non-interactive default deny until file provided
-    return True
+        _hitl_cache = (key, content in {"y","yes","approve","approved"})
+    return _hitl_cache[1]
 
 def governance_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    print('governance_node', state)
+    # Returns only the keys it sets: returning the whole state would re-append every
+    # entry of the list-reduced fields (tool_results, trace, ...).
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("governance_node state=%r", state)
     user_input = state.get("user_input","")
-    state["original_user_input"] = user_input
+    out: Dict[str, Any] = {"original_user_input": user_input}
     moderated = _moderate(user_input) if REQUIRE_MODERATION else {"flagged": False}
     if moderated.get("flagged"):
-        state["reviewed_answer"] = "Request blocked by moderation."
-        state["halt"] = "moderation_block"
-        return state
+        out["reviewed_answer"] = "Request blocked by moderation."
+        out["halt"] = "moderation_block"
+        return out
     redacted = _redact(user_input)
     if redacted != user_input:
-        state["redacted"] = True
-    state["user_input"] = redacted
+        out["redacted"] = True
+    out["user_input"] = redacted
 
     ok, limit = _rate_limit()
     if not ok:
-        state["reviewed_answer"] = f"Rate limit exceeded ({limit}/min). Retry later."
-        state["halt"] = "rate_limited"
-        return state
+        out["reviewed_answer"] = f"Rate limit exceeded ({limit}/min). Retry later."
+        out["halt"] = "rate_limited"
+        return out
 
     # Tool allowlist enforcement (planner may have proposed tools)
     planned_tools = state.get("planned_tools") or []
     disallowed = [t for t in planned_tools if t not in ALLOWED_TOOLS]
     if disallowed:
-        state["reviewed_answer"] = f"Disallowed tools: {disallowed}"
-        state["halt"] = "tool_block"
-        return state
+        out["reviewed_answer"] = f"Disallowed tools: {disallowed}"
+        out["halt"] = "tool_block"
+        return out
 
     if DRY_RUN:
-        state["dry_run"] = True
-        state["reviewed_answer"] = f"Dry-run OK. Planned tools: {planned_tools}"
-        state["halt"] = "dry_run_complete"
-        return state
+        out["dry_run"] = True
+        out["reviewed_answer"] = f"Dry-run OK. Planned tools: {planned_tools}"
+        out["halt"] = "dry_run_complete"
+        return out
 
     if ENABLE_HITL:
         if not _hitl_approval(state):
-            state["reviewed_answer"] = "Awaiting human approval."
-            state["halt"] = "hitl_pending"
-            return state
-        state["hitl_approved"] = True
+            out["reviewed_answer"] = "Awaiting human approval."
+            out["halt"] = "hitl_pending"
+            return out
+        out["hitl_approved"] = True
 
-    return state
\ No newline at end of file
+    return out
@@ -5,32 +5,31 @@
 # Simple heuristic + optional LLM expansion (local Ollama).
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-import os
+import logging, re
 from ..state import MultiAgentState
-from langchain_ollama import ChatOllama
+from ...llm import llm as _llm, OLLAMA_CHAT_MODEL as MODEL
 
-MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
-_llm = ChatOllama(model=MODEL, temperature=0)
+log = logging.getLogger(__name__)
+
+# Built once; only the request is substituted per call.
+_PLANNER_TMPL = (
+    "Decompose the user request into 2-4 concise tasks. "
+    "Label if retrieval needed in case specific questions are asked. Return format must follow exact format: task | needs_rag(bool).\n"
+    "Request: {q}"
+)
+# One case-insensitive scan of the whole response instead of lowercasing every line.
+_NEEDS_RAG = re.compile(r"\b(?:true|yes)\b", re.I)
 
 def planner_node(state: MultiAgentState) -> MultiAgentState:
     q = state["user_input"]
-    prompt = (
-        "Decompose the user request into 2-4 concise tasks. "
-        "Label if retrieval needed in case specific questions are asked. Return format must follow exact format: task | needs_rag(bool).\n"
-        f"Request: {q}"
-    )
-    print('planner-prompt', prompt)
+    prompt = _PLANNER_TMPL.format(q=q)
+    log.debug("planner prompt=%s", prompt)
     resp = _llm.invoke(prompt).content
-    print('planner-prompt-output', resp)
-    tasks = []
-    needs_rag = False
-    for line in resp.splitlines():
-        line=line.strip()
-        if not line: continue
-        tasks.append(line)
-        if "true" in line.lower() or "yes" in line.lower(): needs_rag = True
+    log.debug("planner output=%s", resp)
+    tasks = [l for l in map(str.strip, resp.splitlines()) if l]
+    needs_rag = bool(_NEEDS_RAG.search(resp))
     route = "rag" if needs_rag else "direct"
-    print('planner-route', route)
+    log.debug("planner route=%s", route)
     return {
         "plan": resp,
         "tasks": tasks,
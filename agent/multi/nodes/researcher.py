@@ -1,25 +1,38 @@
 # --------------------------------------------------------------------------------------
 # RESEARCHER (RAG retrieval if planner indicates)
 # --------------------------------------------------------------------------------------
+# Async node: the /rag/search call runs concurrently with tool_exec (both fan out
+# from governance) over the shared pooled client. Identical queries within
+# RETRIEVAL_CACHE_TTL_S are served from the exact retrieval cache (nodes/rag_cache.py).
+# --------------------------------------------------------------------------------------
 from __future__ import annotations
-import os, requests
+import logging, os
 from ..state import MultiAgentState
-from langchain_ollama import ChatOllama
+from ...http import post_lines
+from ...nodes import rag_cache
 
 TOOLS_URL = os.getenv("TOOLS_URL", "http://localhost:8000")
-MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
-_llm = ChatOllama(model=MODEL, temperature=0)
+log = logging.getLogger(__name__)
 
-def researcher_node(state: MultiAgentState) -> MultiAgentState:
-    print('researcher-entered', state)
+async def researcher_node(state: MultiAgentState) -> MultiAgentState:
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("researcher_node state=%r", state)
     if state.get("route") != "rag":
         return {}
     q = state["user_input"]
-    r = requests.post(f"{TOOLS_URL}/rag/search", json={"query": q, "k": 6}, timeout=60)
-    txt = r.json().get("result", "")
-    docs = [{"raw": l} for l in txt.splitlines() if l.strip()]
-    print('researcher-search', docs)
+    key = rag_cache.query_key(q.lower(), 6)
+    lines = rag_cache.exact_get(key)
+    cached = lines is not None
+    if not cached:
+        lines = await post_lines(f"{TOOLS_URL}/rag/search", {"query": q, "k": 6})
+        rag_cache.exact_put(key, lines)
+    docs = [{"raw": l} for l in lines]
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("researcher search docs=%r", docs)
+    meta = {"research_hits": len(docs)}
+    if cached:
+        meta["research_cache"] = "exact"
     return {
         "retrieved_docs": docs,
-        "meta": {"research_hits": len(docs)}
+        "meta": meta
     }
\ No newline at end of file
@@ -8,11 +8,7 @@
 from __future__ import annotations
 # FIX: import from local multi state module (previously pointed to parent state)
 from ..state import MultiAgentState
-from langchain_ollama import ChatOllama
-import os
-
-MODEL = os.getenv("OLLAMA_CHAT_MODEL","llama3.2:1b")
-_llm = ChatOllama(model=MODEL, temperature=0)
+from ...llm import llm as _llm, OLLAMA_CHAT_MODEL as MODEL
 
 def reviewer_node(state: MultiAgentState) -> MultiAgentState:
     draft = state.get("draft_answer", "")
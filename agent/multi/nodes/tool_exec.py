@@ -1,25 +1,36 @@
 # --------------------------------------------------------------------------------------
 # OPTIONAL TOOL EXECUTOR (shell) - triggered if tasks reference a shell op
 # --------------------------------------------------------------------------------------
+# Async node (runs alongside researcher) using the shared pooled HTTP client.
+# Shell tasks are posted concurrently (bounded by TOOL_EXEC_CONCURRENCY), so wall
+# time is the slowest call rather than the sum.
+# --------------------------------------------------------------------------------------
 from __future__ import annotations
-import os, requests
+import asyncio, os
 from ..state import MultiAgentState
+from ...http import JSON_HEADERS, async_client, dumps, loads
 
 TOOLS_URL = os.getenv("TOOLS_URL","http://localhost:8000")
+TOOL_EXEC_CONCURRENCY = int(os.getenv("TOOL_EXEC_CONCURRENCY", "4"))
+
+async def _run_shell(t: str, sem: asyncio.Semaphore):
+    # extract command after a colon or 'shell '
+    cmd = t.split("shell",1)[1].strip(": ").strip()
+    try:
+        async with sem:
+            r = await async_client().post(f"{TOOLS_URL}/shell", content=dumps({"command": cmd}),
+                                          headers=JSON_HEADERS, timeout=25)
+        out = loads(r.content).get("result","")
+    except Exception as e:
+        out = f"[tool error] {e}"
+    return {"task": t, "command": cmd, "output": out}
 
-def tool_executor_node(state: MultiAgentState) -> MultiAgentState:
+async def tool_executor_node(state: MultiAgentState) -> MultiAgentState:
     # naive detection
     shell_tasks = [t for t in state.get("tasks", []) if "shell" in t.lower()]
-    outputs=[]
-    for t in shell_tasks:
-        # extract command after a colon or 'shell '
-        cmd = t.split("shell",1)[1].strip(": ").strip()
-        try:
-            r = requests.post(f"{TOOLS_URL}/shell", json={"command": cmd}, timeout=25)
-            out = r.json().get("result","")
-        except Exception as e:
-            out = f"[tool error] {e}"
-        outputs.append({"task": t, "command": cmd, "output": out})
+    sem = asyncio.Semaphore(max(1, TOOL_EXEC_CONCURRENCY))
+    # gather preserves task order in outputs
+    outputs = await asyncio.gather(*(_run_shell(t, sem) for t in shell_tasks))
     if not outputs:
         return {}
     return {
@@ -8,14 +8,15 @@ from __future__ import annotations
 from typing import TypedDict, List, Dict, Any, Annotated
 import operator
 
+# Previous values are never mutated (they may already be in a checkpoint / stream
+# event). Only no-op updates (every key in `b` already maps to the same value in
+# `a`) skip the copy; any real merge still copies all of `a`.
 def _merge_dict(a: Dict[str, Any] | None, b: Dict[str, Any] | None):
     if not a:
         return b or {}
-    if not b:
+    if not b or b.items() <= a.items():
         return a
-    c = a.copy()
-    c.update(b)
-    return c
+    return {**a, **b}
 
 class MultiAgentState(TypedDict, total=False):
     # Core IO
@@ -29,6 +30,7 @@ class MultiAgentState(TypedDict, total=False):
 
     # Planning / tools
     plan: str
+    tasks: List[str]
     planned_tools: List[str]
     tool_results: Annotated[List[Dict[str, Any]], operator.add]
     used_tools: Annotated[List[str], operator.add]
@@ -53,6 +55,7 @@ class MultiAgentState(TypedDict, total=False):
     audit: Dict[str, Any]
     rolled_back: bool
     content_hash: str
+    content_hash_alg: str
 
     # Error / retries
     error: str
@@ -60,7 +63,7 @@ class MultiAgentState(TypedDict, total=False):
     max_retries: int
 
     # Metadata
-    meta: Dict[str, Any]
+    meta: Annotated[Dict[str, Any], _merge_dict]   # parallel nodes (researcher, tool_exec) both write it
     metadata: Dict[str, Any]
 
     # Observability / aggregation
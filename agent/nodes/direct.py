@@ -14,12 +14,8 @@
 #   - Track token usage and push into state['meta'].
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-import os
 from ..state import GraphState
-from langchain_ollama import ChatOllama
-
-OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
-_llm = ChatOllama(model=OLLAMA_CHAT_MODEL, temperature=0)
+from ..llm import llm as _llm, OLLAMA_CHAT_MODEL
 
 def direct_answer(state: GraphState) -> GraphState:
     resp = _llm.invoke(f"Answer directly and concisely:\n{state['user_input']}")
@@ -15,6 +15,17 @@
 #     IF no answer already exists. Even if 'answer' is present, we append citations
 #     to show a merged structure.
 #
+# CONCURRENCY:
+#   Both branches are coroutine nodes (ChatOllama.ainvoke), so LangGraph runs them
+#   concurrently in the same step: fan-out wall time is max(summary, citations)
+#   instead of the sum. The Ollama server must allow parallel requests
+#   (OLLAMA_NUM_PARALLEL >= 2) for the two generations to overlap.
+#
+# PROMPT LAYOUT:
+#   Constant instructions go in a SystemMessage and only the documents vary in the
+#   HumanMessage, so Ollama (llama.cpp) reuses the KV cache for the unchanged prefix
+#   instead of re-prefilling it on every call.
+#
 # WHY STORE IN parallel_parts?
 #   Ensures branch outputs do not overwrite each other (each writes a distinct key).
 #   The reducer (see state.py) shallow-merges dicts allowing accumulation.
@@ -26,25 +37,29 @@
 # Parallel branches (Ollama)
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-import os
+from langchain_core.messages import HumanMessage, SystemMessage
 from ..state import GraphState
-from langchain_ollama import ChatOllama
+from ..llm import llm as _llm
 
-OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
-_llm = ChatOllama(model=OLLAMA_CHAT_MODEL, temperature=0)
+_SUMMARY_SYSTEM = SystemMessage(content="Summarize key points concisely.")
+_CITATIONS_SYSTEM = SystemMessage(
+    content="Produce bullet citations (no fabrication). If unknown source, label Generic."
+)
 
-def branch_summary(state: GraphState) -> GraphState:
-    docs = "\n".join(d.get("raw","") for d in state.get("retrieved_docs", [])[:8])
-    resp = _llm.invoke(f"Summarize key points concisely:\n{docs}")
+async def branch_summary(state: GraphState) -> GraphState:
+    raw = state.get("retrieved_docs", {}).get("raw", [])
+    if not raw:
+        return {"parallel_parts": {"summary": "(no content)"}}  # nothing to summarize: skip the LLM call
+    docs = "\n".join(raw[:8])
+    resp = await _llm.ainvoke([_SUMMARY_SYSTEM, HumanMessage(content=docs)])
     return {"parallel_parts": {"summary": resp.content}}
 
-def branch_citations(state: GraphState) -> GraphState:
-    docs = state.get("retrieved_docs", [])
-    numbered = "\n".join(f"{i+1}. {d.get('raw','')}" for i, d in enumerate(docs[:8]))
-    resp = _llm.invoke(
-        "Produce bullet citations (no fabrication). If unknown source, label Generic.\n\n"
-        f"{numbered}"
-    )
+async def branch_citations(state: GraphState) -> GraphState:
+    raw = state.get("retrieved_docs", {}).get("raw", [])
+    if not raw:
+        return {"parallel_parts": {"citations": "(none)"}}
+    numbered = "\n".join(f"{i}. {line}" for i, line in enumerate(raw[:8], 1))
+    resp = await _llm.ainvoke([_CITATIONS_SYSTEM, HumanMessage(content=numbered)])
     return {"parallel_parts": {"citations": resp.content}}
 
 def merge_parallel(state: GraphState) -> GraphState:
@@ -4,6 +4,10 @@
 # NODES:
 #   1. rag_retrieve : Calls external tool_server to perform vector similarity search.
 #                     Stores raw string lines as structured doc objects.
+#                     Async (shared httpx client) so the search never blocks the loop;
+#                     hits stream back as NDJSON and are collected in one pass.
+#                     Repeated / near-duplicate queries are served from the exact
+#                     and proximity caches (rag_cache.py) without a round-trip.
 #   2. rag_generate : Consumes retrieved snippets + question to synthesize final answer.
 #
 # WHY SPLIT?
@@ -13,15 +17,19 @@
 #
 # DATA CONTRACT:
 #   rag_retrieve adds:
-#     retrieved_docs: List[{"raw": <string line>}]
+#     retrieved_docs: {"raw": List[<string line>]}  (struct-of-arrays: one list per
+#                     column, no dict per line; add parallel columns, e.g. "score")
 #     meta.rag_hits : Number of lines parsed (for diagnostics).
+#     meta.rag_cache: "exact" / "approx" when served from a cache.
 #
 #   rag_generate reads:
-#     state['retrieved_docs'] (list)
+#     state['retrieved_docs']['raw'] (list of lines)
 #     state['user_input']
 #
 # PROMPTING:
 #   rag_generate instructs the model to use ONLY provided snippets (helps honesty).
+#   The instruction is a constant SystemMessage (KV-cache prefix reuse in Ollama);
+#   snippets + question form the HumanMessage.
 #
 # EXTENSIONS:
 #   - Include provenance (source/page) parsed from each line into structured fields.
@@ -29,31 +37,44 @@
 #   - Guard against empty retrieval (fallback to direct answer or ask clarifying).
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-import os, requests
+import os
+from langchain_core.messages import HumanMessage, SystemMessage
 from ..state import GraphState
-from langchain_ollama import ChatOllama
+from ..http import post_lines
+from . import rag_cache
+from ..llm import llm as _llm, OLLAMA_CHAT_MODEL
 
 TOOLS_URL = os.getenv("TOOLS_URL", "http://localhost:8000")
-OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2:1b")
-_llm = ChatOllama(model=OLLAMA_CHAT_MODEL, temperature=0)
+_GENERATE_SYSTEM = SystemMessage(content="Use ONLY these snippets. If answer absent, say so.")
 
-def rag_retrieve(state: GraphState) -> GraphState:
+async def rag_retrieve(state: GraphState) -> GraphState:
     q = state["user_input"]
-    r = requests.post(f"{TOOLS_URL}/rag/search", json={"query": q, "k": 4}, timeout=60)
-    txt = r.json().get("result", "")
-    docs = [{"raw": line} for line in txt.splitlines() if line.strip()]
+    key = rag_cache.query_key(state.get("user_input_lc") or q.lower(), 4)
+    lines = rag_cache.exact_get(key)
+    if lines is not None:
+        return {
+            "retrieved_docs": {"raw": lines},
+            "meta": {"rag_hits": len(lines), "rag_cache": "exact"}
+        }
+    e = await rag_cache.embed(q)
+    lines = rag_cache.lookup(e)
+    if lines is not None:
+        return {
+            "retrieved_docs": {"raw": lines},
+            "meta": {"rag_hits": len(lines), "rag_cache": "approx"}
+        }
+    lines = await post_lines(f"{TOOLS_URL}/rag/search", {"query": q, "k": 4})
+    rag_cache.exact_put(key, lines)
+    rag_cache.store(e, lines)
     return {
-        "retrieved_docs": docs,
-        "meta": {"rag_hits": len(docs)}
+        "retrieved_docs": {"raw": lines},
+        "meta": {"rag_hits": len(lines)}
     }
 
 def rag_generate(state: GraphState) -> GraphState:
-    snippets = "\n".join(d.get("raw","") for d in state.get("retrieved_docs", [])[:6])
-    prompt = (
-        "Use ONLY these snippets. If answer absent, say so.\n"
-        f"Snippets:\n{snippets}\n\nQuestion: {state['user_input']}\nAnswer:"
-    )
-    resp = _llm.invoke(prompt)
+    snippets = "\n".join(state.get("retrieved_docs", {}).get("raw", [])[:6])
+    prompt = f"Snippets:\n{snippets}\n\nQuestion: {state['user_input']}\nAnswer:"
+    resp = _llm.invoke([_GENERATE_SYSTEM, HumanMessage(content=prompt)])
     return {
         "answer": resp.content,
         "meta": {"rag_model": OLLAMA_CHAT_MODEL}
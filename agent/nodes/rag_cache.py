@@ -0,0 +1,158 @@
+# --------------------------------------------------------------------------------------
+# RAG RETRIEVAL CACHES (exact + proximity)
+# --------------------------------------------------------------------------------------
+# PURPOSE:
+#   Skip the /rag/search round-trip for repeated and near-duplicate queries.
+#   Cached values are the non-empty result lines (List[str]); callers shape them
+#   into their state layout.
+#     1. Exact: sha256 of the normalized query (+ k) -> docs, with a TTL
+#        (RETRIEVAL_CACHE_TTL_S) and LRU bound (RETRIEVAL_CACHE_MAX). No embedding
+#        or network cost; shared by rag_retrieve and the multi-agent researcher
+#        (e.g. eval_harness repeating cases across ablation variants).
+#     2. Proximity (opt-in, PROXIMITY_TAU > 0): each query is embedded locally; if a
+#        cached query lies within cosine distance PROXIMITY_TAU, its result lines are
+#        reused. Entries expire after RETRIEVAL_CACHE_TTL_S, like exact entries.
+#
+# PROXIMITY DESIGN:
+#   - Keys are L2-normalized embeddings stacked in one (capacity x dim) numpy matrix,
+#     so a lookup is a single matrix-vector product + argmax.
+#   - Bounded to PROXIMITY_CAPACITY entries; the least recently hit entry is evicted.
+#   - Embeddings use the same Ollama model as tool_server (OLLAMA_EMBED_MODEL).
+#
+# FAILURE MODES:
+#   The proximity cache is disabled (pure pass-through) when numpy is not installed, PROXIMITY_TAU <= 0
+#   (the default), or the embedding call fails: retrieval then behaves exactly as without the cache.
+#
+# INVALIDATION:
+#   Cached docs reflect the index at lookup time; clear() drops both caches and is
+#   called by clients that trigger /rag/refresh (agent_demo's rag_refresh tool).
+#   Both caches also expire entries after RETRIEVAL_CACHE_TTL_S.
+# --------------------------------------------------------------------------------------
+from __future__ import annotations
+import hashlib, logging, os, time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np  # optional: vectorized similarity over cached keys
+except Exception:
+    np = None
+
+RETRIEVAL_CACHE_TTL_S = float(os.getenv("RETRIEVAL_CACHE_TTL_S", "300"))
+RETRIEVAL_CACHE_MAX = int(os.getenv("RETRIEVAL_CACHE_MAX", "200"))
+PROXIMITY_TAU = float(os.getenv("PROXIMITY_TAU", "0"))
+PROXIMITY_CAPACITY = int(os.getenv("PROXIMITY_CAPACITY", "256"))
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+
+log = logging.getLogger(__name__)
+
+# --------------------------------------------------------------------------------------
+# Exact cache: key -> (expires_at (monotonic), docs), oldest first.
+# --------------------------------------------------------------------------------------
+_exact: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+
+def query_key(q_lc: str, k: int) -> str:
+    # q_lc: the already-lowercased query (the single-agent state carries user_input_lc).
+    return hashlib.sha256(f"{k}\0{q_lc.strip()}".encode("utf-8")).hexdigest()
+
+def exact_get(key: str) -> Optional[List[str]]:
+    hit = _exact.get(key)
+    if hit is None:
+        return None
+    if hit[0] < time.monotonic():
+        del _exact[key]
+        return None
+    _exact.move_to_end(key)
+    return hit[1]
+
+def exact_put(key: str, docs: List[str]):
+    if RETRIEVAL_CACHE_MAX <= 0:
+        return
+    _exact[key] = (time.monotonic() + RETRIEVAL_CACHE_TTL_S, docs)
+    _exact.move_to_end(key)
+    while len(_exact) > RETRIEVAL_CACHE_MAX:
+        _exact.popitem(last=False)
+
+# --------------------------------------------------------------------------------------
+# Proximity cache
+# --------------------------------------------------------------------------------------
+class ProximityCache:
+    def __init__(self, tau: float = PROXIMITY_TAU, capacity: int = PROXIMITY_CAPACITY,
+                 ttl_s: float = RETRIEVAL_CACHE_TTL_S):
+        self.tau = tau
+        self.capacity = max(1, capacity)
+        self.ttl_s = ttl_s
+        self._keys = None              # (capacity, dim) normalized embeddings
+        self._used = None              # (capacity,) last-hit tick, for LRU eviction
+        self._expires = None           # (capacity,) expires_at (monotonic)
+        self._vals: List[Optional[List[str]]] = [None] * self.capacity
+        self._size = 0
+        self._tick = 0
+
+    def clear(self):
+        self._keys = self._used = self._expires = None
+        self._vals = [None] * self.capacity
+        self._size = 0
+
+    def get(self, e) -> Optional[List[str]]:
+        if not self._size:
+            return None
+        sims = self._keys[: self._size] @ e
+        sims[self._expires[: self._size] < time.monotonic()] = -np.inf
+        i = int(sims.argmax())
+        if 1.0 - float(sims[i]) > self.tau:
+            return None
+        self._tick += 1
+        self._used[i] = self._tick
+        return self._vals[i]
+
+    def put(self, e, docs: List[str]):
+        if self._keys is None or self._keys.shape[1] != e.shape[0]:
+            self._keys = np.zeros((self.capacity, e.shape[0]), dtype=np.float32)
+            self._used = np.zeros(self.capacity, dtype=np.int64)
+            self._expires = np.zeros(self.capacity, dtype=np.float64)
+            self._vals = [None] * self.capacity
+            self._size = 0
+        if self._size < self.capacity:
+            i = self._size
+            self._size += 1
+        else:
+            i = int(self._used.argmin())
+        self._tick += 1
+        self._keys[i] = e
+        self._used[i] = self._tick
+        self._expires[i] = time.monotonic() + self.ttl_s
+        self._vals[i] = docs
+
+_cache = ProximityCache()
+_embedder = None
+
+def enabled() -> bool:
+    return np is not None and _cache.tau > 0
+
+async def embed(q: str):
+    # Returns the normalized query embedding, or None (cache bypassed) on failure.
+    global _embedder
+    if not enabled():
+        return None
+    try:
+        if _embedder is None:
+            from langchain_ollama import OllamaEmbeddings
+            _embedder = OllamaEmbeddings(model=OLLAMA_EMBED_MODEL)
+        e = np.asarray(await _embedder.aembed_query(q), dtype=np.float32)
+    except Exception as ex:
+        log.debug("proximity cache bypassed: embed failed: %s", ex)
+        return None
+    n = float(np.linalg.norm(e))
+    return e / n if n else None
+
+def lookup(e) -> Optional[List[str]]:
+    return None if e is None else _cache.get(e)
+
+def store(e, docs: List[str]):
+    if e is not None:
+        _cache.put(e, docs)
+
+def clear():
+    _exact.clear()
+    _cache.clear()
@@ -16,24 +16,33 @@
 # OUTPUT:
 #   Returns partial state containing:
 #     route : chosen route literal
+#     user_input_lc : lowercased user_input, computed once here (entry node) and
+#                     reused downstream (e.g. rag_retrieve's cache key)
 #     meta  : diagnostic info (who routed, maybe reasoning later)
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-from typing import Literal
-from ..state import GraphState
+import re
+from typing import List, Tuple
+from ..state import GraphState, Route
 
-def route_node(state: GraphState) -> GraphState:
-    user_input = state["user_input"].lower()
+# SIMPLE HEURISTICS (checked in priority order, first match wins):
+#   - Contains "shell" or begins with typical shell commands  -> tool
+#   - Mentions documents / pdf / citation cues                -> rag
+#   - Otherwise                                                -> direct
+# Each route's keywords are one precompiled alternation (matched against the
+# lowercased input), so a route costs a single C-level scan and adding keywords
+# does not add Python checks.
+_ROUTE_PATTERNS: List[Tuple[re.Pattern, Route]] = [
+    (re.compile(r"^(?:ls |pwd)|shell"), "tool"),
+    (re.compile(r"document|pdf|according to"), "rag"),
+]
 
-    # SIMPLE HEURISTICS:
-    #   - Contains "shell" or begins with typical shell commands  -> tool
-    #   - Mentions documents / pdf / citation cues                -> rag
-    #   - Otherwise                                                -> direct
-    if "shell" in user_input or user_input.startswith("ls ") or user_input.startswith("pwd"):
-        route: Literal["tool"] = "tool"
-    elif "document" in user_input or "pdf" in user_input or "according to" in user_input:
-        route = "rag"
-    else:
-        route = "direct"
+def route_node(state: GraphState) -> GraphState:
+    user_input_lc = state["user_input"].lower()
+    route: Route = "direct"
+    for pattern, r in _ROUTE_PATTERNS:
+        if pattern.search(user_input_lc):
+            route = r
+            break
 
-    return {"route": route, "meta": {"routed_by": "router_node"}}
\ No newline at end of file
+    return {"route": route, "user_input_lc": user_input_lc, "meta": {"routed_by": "router_node"}}
\ No newline at end of file
@@ -9,6 +9,8 @@
 #   - This node sends user command unmodified after stripping "shell " prefix.
 #   - In production: ALWAYS add stronger validation / sandboxing.
 #
+# Async node: the /shell call goes through the shared httpx client.
+#
 # STATE IMPACT:
 #   Adds:
 #     tool_results: [{"command": <cmd>, "output": <stdout_or_error>}]
@@ -19,20 +21,22 @@
 #   - Add multiple tool types (e.g., HTTP fetch) with structured dispatch.
 # --------------------------------------------------------------------------------------
 from __future__ import annotations
-import requests, os
+import os
 from ..state import GraphState
+from ..http import JSON_HEADERS, async_client, dumps, loads
 
 TOOLS_URL = os.getenv("TOOLS_URL", "http://localhost:8000")
 
-def tool_shell(state: GraphState) -> GraphState:
+async def tool_shell(state: GraphState) -> GraphState:
     # Naive parse: If user typed "shell <command>", extract the substring after prefix.
     user = state["user_input"]
     if user.startswith("shell "):
         cmd = user[6:]
     else:
         cmd = user
-    r = requests.post(f"{TOOLS_URL}/shell", json={"command": cmd}, timeout=30)
-    result = r.json().get("result", "")
+    r = await async_client().post(f"{TOOLS_URL}/shell", content=dumps({"command": cmd}),
+                                  headers=JSON_HEADERS, timeout=30)
+    result = loads(r.content).get("result", "")
     return {
         "tool_results": [{"command": cmd, "output": result}],
         "answer": result
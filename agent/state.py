@@ -36,15 +36,23 @@ def _merge_list(prev: Optional[List], new: Optional[List]):
     return prev + new
 
 def _merge_dict(prev: Optional[Dict], new: Optional[Dict]):
-    merged = {}
-    if prev: merged.update(prev)
-    if new: merged.update(new)
-    return merged
+    if not prev: return dict(new) if new else {}
+    if not new: return prev
+    return {**prev, **new}
+
+def _merge_soa(prev: Optional[Dict[str, List]], new: Optional[Dict[str, List]]):
+    # Column-wise concat of struct-of-arrays fields ({"raw": [...], "score": [...]}).
+    if not prev:
+        return dict(new) if new else {}
+    if not new:
+        return dict(prev)
+    return {k: prev.get(k, []) + new.get(k, []) for k in {**prev, **new}}
 
 class GraphState(TypedDict, total=False):
     user_input: str                 # Original user query
+    user_input_lc: str              # Lowercased user_input (set once by the router)
     route: Route                    # Selected route
-    retrieved_docs: Annotated[List[Dict[str, Any]], _merge_list]
+    retrieved_docs: Annotated[Dict[str, List[Any]], _merge_soa]  # columns: {"raw": [line, ...]}
     tool_results: Annotated[List[Dict[str, Any]], _merge_list]
     parallel_parts: Annotated[Dict[str, Any], _merge_dict]
     answer: str
@@ -1,9 +1,9 @@
 import os
+import asyncio
 import logging
 import subprocess
 from typing import List, Optional
 from pathlib import Path
-import requests
 import time
 import uuid
 
@@ -14,6 +14,9 @@ from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.tools import Tool
 import textwrap
 
+from agent.http import JSON_HEADERS, async_client, dumps, loads, session
+from agent.nodes import rag_cache
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
 logger = logging.getLogger("agent")
 ctx_logger = logging.getLogger("llm_context")
@@ -64,26 +67,33 @@ class ContextLogHandler(BaseCallbackHandler):
         except Exception as e:
             ctx_logger.debug(f"[CTX END] Unable to log output: {e}")
 
+def _result(method: str, url: str, req_id: str, start: float, r) -> str:
+    # Shared by the sync (requests) and async (httpx) helpers; both responses
+    # expose .content / .text / .status_code.
+    elapsed = (time.time() - start) * 1000
+    try:
+        data = loads(r.content)
+    except Exception:
+        data = {"result": f"(non-JSON body len={len(r.text)})"}
+    result_text = data.get("result", "")
+    preview = (result_text[:300] + ("..." if len(result_text) > 300 else ""))
+    logger.info(f"[HTTP {method:<4} <- {url}] id={req_id} status={r.status_code} ms={elapsed:.1f} result_preview={preview!r}")
+    return data.get("result", f"Error: bad response {r.status_code}")
+
+def _failed(method: str, url: str, req_id: str, start: float, e: Exception) -> str:
+    elapsed = (time.time() - start) * 1000
+    logger.error(f"[HTTP {method:<4} !! {url}] id={req_id} ms={elapsed:.1f} error={e}")
+    return f"Error: HTTP {method} {url} failed: {e}"
+
 def _http_post(path: str, json: dict) -> str:
     url = f"{TOOLS_BASE_URL}{path}"
     req_id = uuid.uuid4().hex[:8]
     start = time.time()
     logger.info(f"[HTTP POST -> {url}] id={req_id} payload={json}")
     try:
-        r = requests.post(url, json=json, timeout=60)
-        elapsed = (time.time() - start) * 1000
-        try:
-            data = r.json()
-        except Exception:
-            data = {"result": f"(non-JSON body len={len(r.text)})"}
-        result_text = data.get("result", "")
-        preview = (result_text[:300] + ("..." if len(result_text) > 300 else ""))
-        logger.info(f"[HTTP POST <- {url}] id={req_id} status={r.status_code} ms={elapsed:.1f} result_preview={preview!r}")
-        return data.get("result", f"Error: bad response {r.status_code}")
+        return _result("POST", url, req_id, start, session().post(url, data=dumps(json), headers=JSON_HEADERS, timeout=60))
     except Exception as e:
-        elapsed = (time.time() - start) * 1000
-        logger.error(f"[HTTP POST !! {url}] id={req_id} ms={elapsed:.1f} error={e}")
-        return f"Error: HTTP POST {url} failed: {e}"
+        return _failed("POST", url, req_id, start, e)
 
 def _http_get(path: str, params: dict) -> str:
     url = f"{TOOLS_BASE_URL}{path}"
@@ -91,49 +101,77 @@ def _http_get(path: str, params: dict) -> str:
     start = time.time()
     logger.info(f"[HTTP GET  -> {url}] id={req_id} params={params}")
     try:
-        r = requests.get(url, params=params, timeout=30)
-        elapsed = (time.time() - start) * 1000
-        try:
-            data = r.json()
-        except Exception:
-            data = {"result": f"(non-JSON body len={len(r.text)})"}
-        result_text = data.get("result", "")
-        preview = (result_text[:300] + ("..." if len(result_text) > 300 else ""))
-        logger.info(f"[HTTP GET  <- {url}] id={req_id} status={r.status_code} ms={elapsed:.1f} result_preview={preview!r}")
-        return data.get("result", f"Error: bad response {r.status_code}")
+        return _result("GET", url, req_id, start, session().get(url, params=params, timeout=30))
+    except Exception as e:
+        return _failed("GET", url, req_id, start, e)
+
+# Async variants (used by the agent loop via ainvoke): the tool calls share one pooled
+# httpx client and do not block the event loop.
+async def _ahttp_post(path: str, json: dict) -> str:
+    url = f"{TOOLS_BASE_URL}{path}"
+    req_id = uuid.uuid4().hex[:8]
+    start = time.time()
+    logger.info(f"[HTTP POST -> {url}] id={req_id} payload={json}")
+    try:
+        return _result("POST", url, req_id, start, await async_client().post(url, content=dumps(json), headers=JSON_HEADERS, timeout=60))
     except Exception as e:
-        elapsed = (time.time() - start) * 1000
-        logger.error(f"[HTTP GET  !! {url}] id={req_id} ms={elapsed:.1f} error={e}")
-        return f"Error: HTTP GET {url} failed: {e}"
+        return _failed("POST", url, req_id, start, e)
+
+async def _ahttp_get(path: str, params: dict) -> str:
+    url = f"{TOOLS_BASE_URL}{path}"
+    req_id = uuid.uuid4().hex[:8]
+    start = time.time()
+    logger.info(f"[HTTP GET  -> {url}] id={req_id} params={params}")
+    try:
+        return _result("GET", url, req_id, start, await async_client().get(url, params=params, timeout=30))
+    except Exception as e:
+        return _failed("GET", url, req_id, start, e)
+
+# A refresh changes what /rag/search returns, so cached retrievals are dropped.
+def _rag_refresh(pdf_dir: str = "") -> str:
+    try:
+        return _http_post("/rag/refresh", {"pdf_dir": pdf_dir})
+    finally:
+        rag_cache.clear()
+
+async def _arag_refresh(pdf_dir: str = "") -> str:
+    try:
+        return await _ahttp_post("/rag/refresh", {"pdf_dir": pdf_dir})
+    finally:
+        rag_cache.clear()
 
 rag_refresh_tool = Tool(
     name="rag_refresh",
     description="Rebuild the PDF index. Optional pdf_dir.",
-    func=lambda pdf_dir="": _http_post("/rag/refresh", {"pdf_dir": pdf_dir}),
+    func=_rag_refresh,
+    coroutine=_arag_refresh,
 )
 
 rag_search_tool = Tool(
     name="rag_search",
     description="Search PDFs. Args: query (str), k (int optional).",
     func=lambda query, k=5: _http_post("/rag/search", {"query": query, "k": k}),
+    coroutine=lambda query, k=5: _ahttp_post("/rag/search", {"query": query, "k": k}),
 )
 
 rag_list_pdfs_tool = Tool(
     name="rag_list_pdfs",
     description="List indexed PDF files (optional folder).",
     func=lambda folder="": _http_get("/rag/list", {"folder": folder}),
+    coroutine=lambda folder="": _ahttp_get("/rag/list", {"folder": folder}),
 )
 
 shell_cmd_tool = Tool(
     name="shell_cmd",
     description="Run safe shell command (ls, pwd, df, echo). Arg: command.",
     func=lambda command: _http_post("/shell", {"command": command}),
+    coroutine=lambda command: _ahttp_post("/shell", {"command": command}),
 )
 
 def main():
     print("LangGraph ReAct Agent (local Ollama + RAG). Type 'exit' to quit.")
     print(f"Using model: {OLLAMA_MODEL}")
-    llm = ChatOllama(model=OLLAMA_MODEL, temperature=0.0)
+    llm = ChatOllama(model=OLLAMA_MODEL, temperature=0.0, keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
 
     tools = [rag_refresh_tool, rag_search_tool, rag_list_pdfs_tool, shell_cmd_tool]
     agent = create_react_agent(
@@ -189,15 +227,20 @@ def main():
         ),
     )
 
+    # One event loop for the whole session so the pooled async client is reused
+    # across turns.
+    asyncio.run(_chat(agent))
+
+async def _chat(agent):
     # Keep full chat history (includes tool traces)
     messages: List[BaseMessage] = []
 
     while True:
-        user_input = input("You: ")
+        user_input = await asyncio.to_thread(input, "You: ")
         if user_input.lower() in {"exit", "quit"}:
             break
         messages.append(HumanMessage(content=user_input))
-        result = agent.invoke(
+        result = await agent.ainvoke(
             {"messages": messages},
             config={"callbacks": [ToolLogHandler(), ContextLogHandler()], "recursion_limit": 8},
         )
@@ -1,17 +1,60 @@
 from __future__ import annotations
-import json, time, statistics, argparse, os
-from typing import List, Dict, Any
-from agent.multi.graph_multi import run_multi
+import asyncio, json, time, statistics, argparse, os, uuid
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+from agent.multi.graph_multi import arun_multi
+
+# Cases run concurrently up to this bound (e.g. the Ollama server's OLLAMA_NUM_PARALLEL).
+# Serial by default: concurrent cases share the Ollama server, so their latency_s is not
+# comparable with serial runs. The value used is recorded in the report.
+EVAL_CONCURRENCY = max(1, int(os.getenv("EVAL_CONCURRENCY", "1")))
+
+try:
+    import orjson  # optional: faster goldens parsing
+except Exception:
+    orjson = None
+
+try:
+    import ahocorasick  # optional (pyahocorasick): one-pass multi-pattern fact matching
+except Exception:
+    ahocorasick = None
+
+try:
+    import numpy as np  # optional: O(n) selection for aggregate() percentiles
+except Exception:
+    np = None
 
 def load_goldens(path: str) -> List[Dict[str, Any]]:
+    if orjson:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+@lru_cache(maxsize=256)
+def _fact_automaton(keys: Tuple[str, ...]):
+    # Built once per distinct fact set (cases repeat across ablation variants).
+    A = ahocorasick.Automaton()
+    for k in keys:
+        A.add_word(k, k)
+    A.make_automaton()
+    return A
+
 def groundedness(answer: str, facts: List[str]) -> float:
     if not facts:
         return 1.0
     answer_l = answer.lower()
-    hits = sum(1 for f in facts if f.lower() in answer_l)
+    if ahocorasick is None:
+        hits = sum(1 for f in facts if f.lower() in answer_l)
+    else:
+        # One pass over the answer finds every (possibly overlapping) fact;
+        # duplicate facts count once per occurrence in `facts`, "" always matches.
+        counts = Counter(f.lower() for f in facts)
+        hits = counts.pop("", 0)
+        if counts:
+            found = {k for _, k in _fact_automaton(tuple(sorted(counts))).iter(answer_l)}
+            hits += sum(counts[k] for k in found)
     return hits / len(facts)
 
 def tool_selection_accuracy(state: Dict[str, Any], expected: List[str]) -> Dict[str, float]:
@@ -27,9 +70,10 @@ def tool_selection_accuracy(state: Dict[str, Any], expected: List[str]) -> Dict[
     f1 = (2 * precision * recall / (precision + recall)) if (precision + recall) else 0
     return {"precision": precision, "recall": recall, "f1": f1}
 
-def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+async def arun_case(case: Dict[str, Any]) -> Dict[str, Any]:
     start = time.perf_counter()
-    state = run_multi(case["input"])
+    # Own checkpointer thread per case: concurrent cases must not share graph state.
+    state = await arun_multi(case["input"], thread_id=f"eval-{case['id']}-{uuid.uuid4().hex[:8]}")
     latency = time.perf_counter() - start
     answer = state.get("reviewed_answer") or state.get("answer") or ""
     g = groundedness(answer, case.get("facts", []))
@@ -42,6 +86,17 @@ def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
         "halt": state.get("halt"),
     }
 
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    return asyncio.run(arun_case(case))
+
+async def arun_cases(cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # I/O-bound (tool_server + Ollama): overlap cases, bounded by EVAL_CONCURRENCY.
+    sem = asyncio.Semaphore(EVAL_CONCURRENCY)
+    async def _one(c):
+        async with sem:
+            return await arun_case(c)
+    return list(await asyncio.gather(*(_one(c) for c in cases)))
+
 def ablations(cases, variants):
     results = []
     for name, env in variants.items():
@@ -51,8 +106,7 @@ def ablations(cases, variants):
         for k,v in env.items():
             prev[k] = os.getenv(k)
             os.environ[k] = str(v)
-        for c in cases:
-            r = run_case(c)
+        for r in asyncio.run(arun_cases(cases)):
             r["variant"] = name
             results.append(r)
         # restore
@@ -67,9 +121,17 @@ def aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     out = {}
     for metric in ["latency_s","groundedness","tool_precision","tool_recall","tool_f1"]:
         vals = [r[metric] for r in rows if metric in r and r.get("halt") is None]
-        if vals:
-            out[f"{metric}_mean"] = statistics.mean(vals)
-            out[f"{metric}_p95"] = sorted(vals)[int(0.95*len(vals))-1]
+        if not vals:
+            continue
+        # p95 by nearest rank: sorted(vals)[int(0.95*n)-1] (n=1 -> the only value).
+        i = (int(0.95 * len(vals)) - 1) % len(vals)
+        if np is not None:
+            a = np.asarray(vals, dtype=float)
+            out[f"{metric}_mean"] = float(a.mean())
+            out[f"{metric}_p95"] = float(np.partition(a, i)[i])
+        else:
+            out[f"{metric}_mean"] = statistics.fmean(vals)
+            out[f"{metric}_p95"] = sorted(vals)[i]
     return out
 
 def main():
@@ -79,8 +141,9 @@ def main():
     args = ap.parse_args()
 
     cases = load_goldens(args.goldens)
-    base_rows = [run_case(c) for c in cases]
-    print("BASE:", json.dumps({"cases": base_rows, "aggregate": aggregate(base_rows)}, indent=2))
+    base_rows = asyncio.run(arun_cases(cases))
+    print("BASE:", json.dumps({"cases": base_rows, "aggregate": aggregate(base_rows),
+                               "concurrency": EVAL_CONCURRENCY}, indent=2))
 
     if args.ablations:
         variants = {
@@ -88,7 +151,7 @@ def main():
             "dry_run": {"DRY_RUN": 1},
         }
         abl_rows = ablations(cases, variants)
-        print("ABLATIONS:", json.dumps({"rows": abl_rows}, indent=2))
+        print("ABLATIONS:", json.dumps({"rows": abl_rows, "concurrency": EVAL_CONCURRENCY}, indent=2))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -17,10 +17,12 @@
 #   - Add --rollback <ckpt_id>, --history, --time-travel <n>.
 #   - Add JSON output mode for programmatic integration.
 # --------------------------------------------------------------------------------------
-import asyncio, argparse, sys
+import asyncio, argparse, logging, os, sys
 from agent.graph import run_agent, run_agent_stream
 
 def main():
+    logging.basicConfig(level=os.getenv("APP_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
     ap = argparse.ArgumentParser()
     ap.add_argument("query", help="User input")
     ap.add_argument("--stream", action="store_true", help="Stream answer tokens")
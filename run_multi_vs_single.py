@@ -4,17 +4,20 @@
 # Measures latency + captures outputs for single-agent vs multi-agent supervisor graph.
 # Quality heuristic: simple length + presence of key terms (placeholder).
 # --------------------------------------------------------------------------------------
-import time, argparse, json
+import time, argparse, json, logging, os
 from agent.graph import run_agent
 from agent.multi.graph_multi import run_multi
 
 def quality_score(text: str, query: str) -> float:
     if not text:
         return 0.0
-    coverage = sum(1 for w in query.lower().split() if w in text.lower())
+    text_l = text.lower()  # once, not per query word
+    coverage = sum(1 for w in query.lower().split() if w in text_l)
     return 0.3*coverage + 0.7*(len(text)/max(len(query),1))
 
 def main():
+    logging.basicConfig(level=os.getenv("APP_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
     ap = argparse.ArgumentParser()
     ap.add_argument("query")
     args = ap.parse_args()
@@ -30,20 +33,22 @@ def main():
     multi_t = time.time()-t1
     multi_ans = multi.get("reviewed_answer") or multi.get("draft_answer","")
 
+    single_q = quality_score(single_ans,q)
+    multi_q = quality_score(multi_ans,q)
     report = {
         "query": q,
         "single": {
             "latency_s": round(single_t,3),
             "answer": single_ans[:500],
-            "quality": round(quality_score(single_ans,q),2)
+            "quality": round(single_q,2)
         },
         "multi": {
             "latency_s": round(multi_t,3),
             "answer": multi_ans[:500],
-            "quality": round(quality_score(multi_ans,q),2)
+            "quality": round(multi_q,2)
         },
         "delta_latency_s": round(multi_t - single_t,3),
-        "quality_improvement": round(quality_score(multi_ans,q)-quality_score(single_ans,q),2)
+        "quality_improvement": round(multi_q-single_q,2)
     }
     print(json.dumps(report, indent=2))
 
@@ -0,0 +1,11 @@
+import importlib
+
+
+def test_sha256_mode_matches_baseline_digest(monkeypatch):
+    monkeypatch.setenv("AUDIT_HASH_SHA256", "1")
+    import agent.multi.nodes.audit as audit
+    audit = importlib.reload(audit)
+    out = audit.audit_node({"answer": 'Héllo, "world"'})
+    assert out["content_hash_alg"] == "sha256"
+    # sha256(json.dumps({"a": ...}, sort_keys=True).encode()) as produced by earlier runs
+    assert out["content_hash"] == "63fb9d3480829069cef5bd73d1215c12252527d788fd3557b187a57fae65b299"
@@ -0,0 +1,174 @@
+import json
+
+import pytest
+
+from agent import checkpoint
+from agent.checkpoint import JSONCheckpointStore
+
+
+def _states(n):
+    # Every state changes "step"; "a" changes every other step; "tmp" only exists in 2..3.
+    out = []
+    for i in range(n):
+        s = {"step": i, "a": i // 2, "fixed": {"x": [1, 2, 3]}}
+        if i in (2, 3):
+            s["tmp"] = f"t{i}"
+        out.append(s)
+    return out
+
+
+def _raw(store):
+    return [json.loads(l) for l in store.file.read_bytes().splitlines() if l.strip()]
+
+
+@pytest.fixture
+def base_every_3(monkeypatch):
+    monkeypatch.setattr(checkpoint, "CKPT_BASE_EVERY", 3)
+
+
+def test_delta_records_round_trip(tmp_path, base_every_3):
+    store = JSONCheckpointStore(path=str(tmp_path))
+    states = _states(8)
+    for i, s in enumerate(states):
+        store.append(s, f"n{i}")
+    raw = _raw(store)
+    assert [r.get("base", False) for r in raw] == [True, False, False, True, False, False, True, False]
+    assert raw[1]["patch"] == {"step": 1}                      # unchanged keys are not written
+    assert raw[4]["drop"] == ["tmp"]                           # removed key recorded as a drop
+    assert [r["state"] for r in store.load_all()] == states
+    assert store.latest_state() == states[-1]
+    for i in range(8):
+        assert store.time_travel(i) == states[i]                # across every base boundary
+
+
+def test_reopen_mixed_full_and_delta_log(tmp_path, base_every_3, monkeypatch):
+    states = _states(10)
+    store = JSONCheckpointStore(path=str(tmp_path))
+    for i, s in enumerate(states[:5]):
+        store.append(s, f"n{i}")
+    store.close()
+    # A legacy full record (no "base" flag) followed by full-only records.
+    with store.file.open("ab") as f:
+        f.write(json.dumps({"id": "legacy", "ts": 0.0, "node": "n5", "state": states[5]}).encode() + b"\n")
+    monkeypatch.setattr(checkpoint, "CKPT_BASE_EVERY", 1)
+    store = JSONCheckpointStore(path=str(tmp_path))
+    for i, s in enumerate(states[6:8], 6):
+        store.append(s, f"n{i}")
+    store.close()
+    monkeypatch.setattr(checkpoint, "CKPT_BASE_EVERY", 3)
+    store = JSONCheckpointStore(path=str(tmp_path))
+    for i, s in enumerate(states[8:], 8):
+        store.append(s, f"n{i}")
+    assert "patch" in _raw(store)[-1]
+    reopened = JSONCheckpointStore(path=str(tmp_path))
+    assert [r["state"] for r in reopened.load_all()] == states
+    assert [reopened.time_travel(i) for i in range(10)] == states
+    assert reopened.latest_state() == states[-1]
+
+
+def _fill(path, n=5):
+    store = JSONCheckpointStore(path=str(path))
+    for i, s in enumerate(_states(n)):
+        store.append(s, f"n{i}")
+    store.close()
+    return store
+
+
+def test_torn_final_line_is_ignored(tmp_path, base_every_3):
+    store = _fill(tmp_path)
+    good = store.file.read_bytes()
+    with store.file.open("ab") as f:
+        f.write(b'{"id": "torn", "ts": 1.0, "node": "n5", "patch": {"st')
+    store = JSONCheckpointStore(path=str(tmp_path))
+    assert store.file.read_bytes() == good
+    assert [r["state"] for r in store.load_all()] == _states(5)
+    store.append({"step": 99}, "after")
+    reopened = JSONCheckpointStore(path=str(tmp_path))
+    assert reopened.latest_state() == {"step": 99}
+    assert len(reopened.load_all()) == 6
+
+
+@pytest.mark.parametrize("damage", ["missing", "stale", "garbage"])
+def test_index_rebuilt_when_missing_or_stale(tmp_path, base_every_3, damage):
+    store = _fill(tmp_path)
+    expected = list(store._entries)
+    if damage == "missing":
+        store.idx_file.unlink()
+    elif damage == "stale":
+        lines = store.idx_file.read_text().splitlines(keepends=True)
+        store.idx_file.write_text("".join(lines[:2]))
+    else:
+        store.idx_file.write_text("not\tan\tindex\n")
+    reopened = JSONCheckpointStore(path=str(tmp_path))
+    assert reopened._entries == expected
+    assert reopened.idx_file.read_text() == "".join(reopened._index_line(*e) for e in expected)
+    assert [reopened.time_travel(i) for i in range(5)] == _states(5)
+
+
+def test_rollback_mid_log_then_append(tmp_path, base_every_3):
+    store = JSONCheckpointStore(path=str(tmp_path))
+    states = _states(8)
+    ids = [store.append(s, f"n{i}") for i, s in enumerate(states)]
+    assert store.rollback("missing") is None
+    assert store.rollback(ids[4]) == states[4]                  # a delta record
+    assert [e[0] for e in store._entries] == ids[:5]
+    assert store._bases == [0, 3]
+    assert store._last_enc is None                              # next record must be a base
+    new_id = store.append({"step": 42, "a": 0}, "after")
+    assert _raw(store)[-1]["base"] is True
+    expected = states[:5] + [{"step": 42, "a": 0}]
+    assert [r["state"] for r in store.load_all()] == expected
+    assert store.latest_state() == expected[-1]
+    assert [store.time_travel(i) for i in range(6)] == expected
+    assert store.idx_file.read_text() == "".join(store._index_line(*e) for e in store._entries)
+    reopened = JSONCheckpointStore(path=str(tmp_path))
+    assert [e[0] for e in reopened._entries] == ids[:5] + [new_id]
+    assert [reopened.time_travel(i) for i in range(6)] == expected
+
+
+def _alternating(store, n):
+    # Nodes a / b alternate; returns the states written, in order.
+    states = []
+    for i in range(n):
+        s = {"step": i, "node": "ab"[i % 2]}
+        store.append(s, "ab"[i % 2])
+        states.append(s)
+    return states
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_compact_keeps_last_n_per_node_and_archives(tmp_path, base_every_3, monkeypatch, codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    else:
+        monkeypatch.setattr(checkpoint, "zstandard", None)
+    store = JSONCheckpointStore(path=str(tmp_path))
+    states = _alternating(store, 9)
+    assert store.compact(keep_last_n=2) == 4
+    kept = [states[i] for i in (5, 6, 7, 8)]
+    assert [r["state"] for r in store.load_all()] == kept
+    assert all(r.get("base") for r in _raw(store))             # kept deltas re-encoded as bases
+    assert not store.file.with_name(store.file.name + ".tmp").exists()
+    archived = list((tmp_path / ".archive").iterdir())
+    assert len(archived) == 1 and archived[0].name.endswith(".zst" if codec == "zstd" else ".gz")
+    assert [r["state"] for r in store.iter_archive()] == states
+    # Index rebuilt against the compacted log.
+    assert len(store._entries) == 4 and store._bases == [0, 1, 2, 3]
+    assert store.idx_file.read_text() == "".join(store._index_line(*e) for e in store._entries)
+    assert [store.time_travel(i) for i in range(4)] == kept
+    store.append({"step": 9}, "a")
+    assert JSONCheckpointStore(path=str(tmp_path)).latest_state() == {"step": 9}
+
+
+def test_auto_compaction_is_opt_in(tmp_path, monkeypatch):
+    store = JSONCheckpointStore(path=str(tmp_path / "off"))
+    _alternating(store, 20)
+    assert len(store.load_all()) == 20
+    monkeypatch.setattr(checkpoint, "CKPT_COMPACT_BYTES", 200)
+    monkeypatch.setattr(checkpoint, "CKPT_COMPACT_KEEP", 1)
+    monkeypatch.setattr(checkpoint, "CKPT_ARCHIVE", False)
+    store = JSONCheckpointStore(path=str(tmp_path / "on"))
+    states = _alternating(store, 20)
+    recs = store.load_all()
+    assert len(recs) < 20 and recs[-1]["state"] == states[-1]
+    assert not (tmp_path / "on" / ".archive").exists()
@@ -0,0 +1,37 @@
+import pytest
+
+from agent import checkpoint
+from agent.checkpoint import JSONCheckpointStore
+
+
+def test_flush_raises_first_background_error(tmp_path, monkeypatch):
+    store = JSONCheckpointStore(path=str(tmp_path))
+    real_write = store._write
+    calls = []
+
+    def flaky(enc, node):
+        calls.append(node)
+        if node == "n0":
+            raise OSError("disk full")
+        return real_write(enc, node)
+
+    monkeypatch.setattr(store, "_write", flaky)
+    for i in range(3):
+        store.submit({"i": i}, f"n{i}")
+    with pytest.raises(OSError, match="disk full"):
+        store.flush()
+    assert calls == ["n0", "n1", "n2"]
+    store.flush()  # error is reported once
+    assert [r["node"] for r in store.load_all()] == ["n1", "n2"]
+    store.close()
+
+
+def test_atexit_registered_once_per_path(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(checkpoint.atexit, "register", lambda fn, *a: registered.append(a))
+    stores = [JSONCheckpointStore(path=str(tmp_path / "a")) for _ in range(3)]
+    stores.append(JSONCheckpointStore(path=str(tmp_path / "b")))
+    assert len(registered) == 2
+    stores[0].submit({"x": 1}, "n")
+    checkpoint._close_stores((tmp_path / "a").resolve())
+    assert stores[0]._pending == [] and stores[0]._fh is None
@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from agent import http
+
+
+def _serve(monkeypatch, body: bytes, content_type: str):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, content=body, headers={"content-type": content_type})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            monkeypatch.setattr(http, "async_client", lambda: client)
+            return await http.post_lines("http://tools/rag/search", {"query": "q", "k": 3})
+
+    return asyncio.run(run()), seen
+
+
+def test_post_lines_parses_ndjson_stream(monkeypatch):
+    # Blank-raw object, an empty line between records and extra trailing newlines.
+    body = (b'{"raw": "[1] a.pdf#p0: first"}\n'
+            b'{"raw": "   "}\n'
+            b'\n'
+            b'{"raw": "[2] b.pdf#p3: second"}\n'
+            b'\n')
+    lines, seen = _serve(monkeypatch, body, "application/x-ndjson")
+    assert lines == ["[1] a.pdf#p0: first", "[2] b.pdf#p3: second"]
+    assert seen[0].headers["accept"] == "application/x-ndjson"
+    assert json.loads(seen[0].content) == {"query": "q", "k": 3}
+
+
+def test_post_lines_falls_back_to_result_body(monkeypatch):
+    body = json.dumps({"result": "[1] a.pdf#p0: first\n\n[2] b.pdf#p3: second\n"}).encode()
+    lines, _ = _serve(monkeypatch, body, "application/json")
+    assert lines == ["[1] a.pdf#p0: first", "[2] b.pdf#p3: second"]
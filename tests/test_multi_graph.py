@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langgraph")
+httpx = pytest.importorskip("httpx")
+
+import agent.multi.graph_multi as gm
+from agent.checkpoint import JSONCheckpointStore
+from agent.multi.nodes import executor, planner, researcher, reviewer, tool_exec
+from agent.nodes import rag_cache
+
+
+class _Resp:
+    def __init__(self, content):
+        self.content = content
+
+
+class _FakeLLM:
+    def __init__(self, out):
+        self.out = out
+
+    def invoke(self, prompt, **kwargs):
+        return _Resp(self.out)
+
+
+@pytest.fixture
+def multi(tmp_path, monkeypatch):
+    # Planner asks for retrieval (route "rag") and one shell task, so researcher and
+    # tool_exec both run in the superstep after governance.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(planner, "_llm", _FakeLLM("look it up | true\nshell: echo hi"))
+    monkeypatch.setattr(executor, "_llm", _FakeLLM("draft"))
+    monkeypatch.setattr(reviewer, "_llm", _FakeLLM("ANSWER: final\nCRITIQUE: ok"))
+    monkeypatch.setattr(gm, "_ckpt", JSONCheckpointStore(path=str(tmp_path / "ckpt")))
+    shell_calls = []
+
+    def handler(request):
+        shell_calls.append(request.content)
+        return httpx.Response(200, json={"result": "hi"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(tool_exec, "async_client", lambda: client)
+
+    async def fake_post_lines(url, payload, timeout=60):
+        return ["[1] doc.pdf#p0: snippet"]
+
+    monkeypatch.setattr(researcher, "post_lines", fake_post_lines)
+    rag_cache.clear()
+    yield shell_calls
+    rag_cache.clear()
+
+
+def test_rag_route_with_shell_task_completes(multi):
+    final = asyncio.run(gm.arun_multi("what is in my docs?", thread_id="rag-shell"))
+    assert final["reviewed_answer"] == "final"
+    assert final["meta"]["tool_exec_count"] == 1
+    assert final["meta"]["research_hits"] == 1
+    assert final["retrieved_docs"] == [{"raw": "[1] doc.pdf#p0: snippet"}]
+
+
+def test_tool_results_appended_once_per_call(multi):
+    final = asyncio.run(gm.arun_multi("what is in my docs?", thread_id="counts"))
+    assert len(multi) == 1
+    assert [r["output"] for r in final["tool_results"]] == ["hi"]
+    assert [t["node"] for t in final["trace"]].count("governance") == 1
+    # Same thread: results accumulate per run, never re-appended.
+    final = asyncio.run(gm.arun_multi("and again?", thread_id="counts"))
+    assert len(multi) == 2
+    assert len(final["tool_results"]) == 2
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from agent.nodes import rag_cache
+from agent.nodes.rag_cache import ProximityCache
+
+
+def _unit(*xs):
+    np = pytest.importorskip("numpy")
+    v = np.asarray(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_proximity_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rag_cache.time, "monotonic", lambda: now[0])
+    cache = ProximityCache(tau=0.05, capacity=4, ttl_s=10)
+    cache.put(_unit(1, 0, 0), ["doc"])
+    assert cache.get(_unit(1, 0.01, 0)) == ["doc"]
+    now[0] += 11
+    assert cache.get(_unit(1, 0.01, 0)) is None
+
+
+def test_clear_drops_proximity_entries():
+    cache = ProximityCache(tau=0.05, capacity=4, ttl_s=10)
+    cache.put(_unit(0, 1, 0), ["doc"])
+    cache.clear()
+    assert cache.get(_unit(0, 1, 0)) is None
+
+
+@pytest.fixture
+def exact_cache(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rag_cache.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rag_cache, "RETRIEVAL_CACHE_TTL_S", 10.0)
+    monkeypatch.setattr(rag_cache, "RETRIEVAL_CACHE_MAX", 2)
+    rag_cache.clear()
+    yield now
+    rag_cache.clear()
+
+
+def test_exact_entries_expire(exact_cache):
+    key = rag_cache.query_key("what is x?", 4)
+    rag_cache.exact_put(key, ["doc"])
+    exact_cache[0] += 9
+    assert rag_cache.exact_get(key) == ["doc"]
+    exact_cache[0] += 2
+    assert rag_cache.exact_get(key) is None
+    assert key not in rag_cache._exact
+
+
+def test_exact_cache_evicts_least_recently_used(exact_cache):
+    a, b, c = (rag_cache.query_key(q, 4) for q in "abc")
+    rag_cache.exact_put(a, ["a"])
+    rag_cache.exact_put(b, ["b"])
+    assert rag_cache.exact_get(a) == ["a"]           # a is now the most recent
+    rag_cache.exact_put(c, ["c"])
+    assert rag_cache.exact_get(b) is None
+    assert rag_cache.exact_get(a) == ["a"] and rag_cache.exact_get(c) == ["c"]
+
+
+def test_exact_cache_disabled_with_zero_max(exact_cache, monkeypatch):
+    monkeypatch.setattr(rag_cache, "RETRIEVAL_CACHE_MAX", 0)
+    key = rag_cache.query_key("q", 4)
+    rag_cache.exact_put(key, ["doc"])
+    assert rag_cache.exact_get(key) is None
+
+
+def test_keys_separate_k_and_normalize_whitespace():
+    assert rag_cache.query_key(" q ", 4) == rag_cache.query_key("q", 4)
+    assert rag_cache.query_key("q", 4) != rag_cache.query_key("q", 6)
+
+
+def _counting_post_lines(calls):
+    async def post_lines(url, payload, timeout=60):
+        calls.append(payload)
+        return ["[1] doc.pdf#p0: hit"]
+    return post_lines
+
+
+def test_rag_retrieve_flags_exact_hits(exact_cache, monkeypatch):
+    pytest.importorskip("langchain_ollama")
+    from agent.nodes import rag
+    monkeypatch.setattr(rag_cache._cache, "tau", 0)   # exact cache only
+    calls = []
+    monkeypatch.setattr(rag, "post_lines", _counting_post_lines(calls))
+    state = {"user_input": "What is X?", "user_input_lc": "what is x?"}
+    first = asyncio.run(rag.rag_retrieve(state))
+    assert first["meta"] == {"rag_hits": 1}
+    second = asyncio.run(rag.rag_retrieve(state))
+    assert second["meta"] == {"rag_hits": 1, "rag_cache": "exact"}
+    assert second["retrieved_docs"] == first["retrieved_docs"]
+    assert len(calls) == 1
+
+
+def test_researcher_flags_exact_hits(exact_cache, monkeypatch):
+    pytest.importorskip("langchain_ollama")
+    from agent.multi.nodes import researcher
+    calls = []
+    monkeypatch.setattr(researcher, "post_lines", _counting_post_lines(calls))
+    state = {"user_input": "What is X?", "route": "rag"}
+    assert "research_cache" not in asyncio.run(researcher.researcher_node(state))["meta"]
+    out = asyncio.run(researcher.researcher_node(state))
+    assert out["meta"] == {"research_hits": 1, "research_cache": "exact"}
+    assert len(calls) == 1
+    exact_cache[0] += 11                              # expired: searched again
+    assert "research_cache" not in asyncio.run(researcher.researcher_node(state))["meta"]
+    assert len(calls) == 2
@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("langgraph")
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from agent.state import GraphState
+
+
+def test_reducers_do_not_rewrite_checkpoint_history():
+    g = StateGraph(GraphState)
+    g.add_node("n1", lambda s: {"tool_results": [{"t": "a"}], "meta": {"n1": 1}})
+    g.add_node("n2", lambda s: {"tool_results": [{"t": "b"}], "meta": {"n2": 1}})
+    g.add_node("n3", lambda s: {"tool_results": [{"t": "c"}], "meta": {"n3": 1}})
+    g.add_edge(START, "n1")
+    g.add_edge("n1", "n2")
+    g.add_edge("n2", "n3")
+    g.add_edge("n3", END)
+    app = g.compile(checkpointer=MemorySaver())
+    cfg = {"configurable": {"thread_id": "t"}}
+    app.invoke({"user_input": "q"}, cfg)
+
+    history = list(app.get_state_history(cfg))  # newest first
+    after_n2 = next(s for s in history if s.metadata.get("step") == 2)
+    assert [r["t"] for r in after_n2.values["tool_results"]] == ["a", "b"]
+    assert after_n2.values["meta"] == {"n1": 1, "n2": 1}
+    assert [r["t"] for r in history[0].values["tool_results"]] == ["a", "b", "c"]
@@ -0,0 +1,176 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("fastapi")
+
+import tool_server as ts
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+def _vec(text):
+    rng = np.random.default_rng(abs(hash(text)) % 2**32)
+    return rng.random(16).tolist()
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, **kwargs):
+        pass
+
+    def embed_documents(self, texts):
+        return [_vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return _vec(text)
+
+
+def _fake_load(path):
+    text = Path(path).read_text()
+    return 1, [Document(page_content=f"{text} part{i}", metadata={"source": path, "page": 0}) for i in range(3)]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    monkeypatch.setattr(ts, "RAG_PDF_DIR", str(pdfs))
+    monkeypatch.setattr(ts, "RAG_INDEX_DIR", str(tmp_path / "idx"))
+    monkeypatch.setattr(ts, "RAG_LOAD_WORKERS", 1)
+    monkeypatch.setattr(ts, "OllamaEmbeddings", FakeEmbeddings)
+    monkeypatch.setattr(ts, "_load_one", _fake_load)
+    return pdfs
+
+
+def test_handlers_run_on_sized_executor(server, monkeypatch):
+    monkeypatch.setattr(ts, "TOOLS_THREAD_LIMIT", 3)
+    (server / "a.pdf").write_text("doc a")
+    with TestClient(ts.app) as client:
+        assert client.post("/rag/search", json={"query": "doc a part1", "k": 1}).json()["result"]
+        tools = [t for t in threading.enumerate() if t.name.startswith("tools")]
+        assert 0 < len(tools) <= 3
+
+
+def test_exact_path_is_full_precision(monkeypatch):
+    monkeypatch.setattr(ts, "RAG_INDEX_QUANT", "sq8")
+    vectors = np.random.default_rng(0).random((50, 16), dtype=np.float32)
+    index = ts._new_index(vectors)
+    index.add(vectors)
+    _, rows = index.search(vectors, 1)
+    assert isinstance(index, ts.faiss.IndexFlatL2)
+    assert (rows[:, 0] == np.arange(50)).all()
+
+
+def _chunks(prefix, n):
+    return [Document(page_content=f"{prefix} {i}", metadata={}) for i in range(n)], [f"{prefix}-{i}" for i in range(n)]
+
+
+def test_incremental_add_to_sq8_index_keeps_recall(monkeypatch):
+    monkeypatch.setattr(ts, "RAG_INDEX_QUANT", "sq8")
+    monkeypatch.setattr(ts, "RAG_EXACT_MAX", 0)
+    monkeypatch.setattr(ts, "RAG_HNSW_M", 16)
+    emb = FakeEmbeddings()
+    vs = ts._add_chunks(None, *_chunks("first", 1), emb)     # quantizer trained on 1 vector
+    docs, ids = _chunks("refresh", 600)
+    vs = ts._add_chunks(ts._copy_vs(vs, emb), docs, ids, emb)
+    assert vs.index.ntotal == 601
+    hits = sum(vs.similarity_search_by_vector(_vec(d.page_content), 1)[0].page_content == d.page_content
+               for d in docs)
+    assert hits / len(docs) >= 0.9
+
+
+def test_needs_retrain_on_out_of_range_vectors(monkeypatch):
+    monkeypatch.setattr(ts, "RAG_INDEX_QUANT", "sq8")
+    monkeypatch.setattr(ts, "RAG_EXACT_MAX", 0)
+    monkeypatch.setattr(ts, "RAG_HNSW_M", 16)
+    base = np.random.default_rng(0).random((400, 16), dtype=np.float32)
+    index = ts._new_index(base)
+    index.add(base)
+    assert not ts._needs_retrain(index, base[:5])
+    assert ts._needs_retrain(index, base[:5] + 2.0)
+    assert ts._needs_retrain(index, base[:100])                  # 25% of the index
+    assert not ts._needs_retrain(ts.faiss.IndexFlatL2(16), base + 2.0)
+
+
+def _worker_state():
+    from types import SimpleNamespace
+    return SimpleNamespace(embeddings=CountingEmbeddings(), vs=None, index_stamp=None,
+                           result_cache=ts._ResultCache(0.98, 0))
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    embedded = 0
+
+    def embed_documents(self, texts):
+        CountingEmbeddings.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_cold_worker_loads_saved_index_instead_of_rebuilding(server, monkeypatch):
+    (server / "a.pdf").write_text("doc a")
+    (server / "b.pdf").write_text("doc b")
+    a, b = _worker_state(), _worker_state()
+    CountingEmbeddings.embedded = 0
+    _, vs_a = ts._refresh(a, "", load_first=True)
+    assert CountingEmbeddings.embedded == 6
+    msg, vs_b = ts._refresh(b, "", load_first=True)
+    assert msg == "Index loaded." and CountingEmbeddings.embedded == 6
+    assert vs_b.index.ntotal == vs_a.index.ntotal and b.index_stamp == a.index_stamp
+
+
+def test_result_cache_larger_k_replaces_entry():
+    cache = ts._ResultCache(0.98, 8)
+    q = _vec("query")
+    cache.put(q, 2, ["d1", "d2"])
+    assert cache.get(q, 1) == ["d1"]
+    assert cache.get(q, 5) is None
+    cache.put(q, 5, ["d1", "d2", "d3", "d4", "d5"])
+    assert cache.get(q, 5) == ["d1", "d2", "d3", "d4", "d5"]
+    assert cache.get(q, 2) == ["d1", "d2"]
+    cache.put(q, 3, ["x"])                       # smaller k never shrinks the entry
+    assert cache.get(q, 5) == ["d1", "d2", "d3", "d4", "d5"]
+    assert cache._index.ntotal == 1
+
+
+def test_shell_rejects_commands_outside_allowlist(server):
+    with TestClient(ts.app) as client:
+        assert client.post("/shell", json={"command": "rm -rf /tmp/x"}).json() == {
+            "result": "Error: command 'rm' not allowed"}
+        assert client.post("/shell", json={"command": "   "}).json() == {"result": "Error: empty command"}
+        assert client.post("/shell", json={"command": 'echo "unterminated'}).json()["result"].startswith(
+            "Error: cannot parse command")
+
+
+def test_shell_args_are_not_interpreted_by_a_shell(server):
+    with TestClient(ts.app) as client:
+        def run(cmd):
+            return client.post("/shell", json={"command": cmd}).json()["result"]
+        assert run('echo "a  b"') == "a  b"                  # quoting kept, one argv entry
+        assert run("echo hi; rm -rf x") == "hi; rm -rf x"     # no command chaining
+        assert run("echo $HOME `id` > out") == "$HOME `id` > out"
+        assert not (Path.cwd() / "out").exists()
+
+
+def test_shell_timeout_kills_process(server, monkeypatch):
+    monkeypatch.setattr(ts, "TOOLS_SHELL_TIMEOUT_S", 0.2)
+    procs = []
+    real_exec = ts.asyncio.create_subprocess_exec
+
+    async def slow_exec(*argv, **kwargs):
+        # Allowlisted argv as far as the handler is concerned, but it never finishes in time.
+        proc = await real_exec("sleep", "5", **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(ts.asyncio, "create_subprocess_exec", slow_exec)
+    with TestClient(ts.app) as client:
+        t0 = ts.time.monotonic()
+        assert client.post("/shell", json={"command": "echo slow"}).json() == {
+            "result": "Error: timed out after 0.2s"}
+        assert ts.time.monotonic() - t0 < 4
+    assert procs[0].returncode is not None and procs[0].returncode < 0   # killed by signal
@@ -1,31 +1,121 @@
 import os
+import asyncio
+import hashlib
 import logging
+import importlib.util
+import pickle
+import random
+import shlex
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, Dict, List, Tuple
 
 from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import time
 import uuid
 import json
 
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_ollama import OllamaEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import faiss
+
+try:
+    import orjson  # optional: faster response encoding
+except Exception:
+    orjson = None
+
+try:
+    import fcntl  # optional (POSIX): cross-process lock around index saves / loads
+except Exception:
+    fcntl = None
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
 log = logging.getLogger("tool_server")
 
 OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+TOOLS_SHELL_TIMEOUT_S = float(os.getenv("TOOLS_SHELL_TIMEOUT_S", "10"))
 RAG_PDF_DIR = os.getenv("RAG_PDF_DIR", "/mnt/d/AI/data/personal/pdfs")
 RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "/mnt/d/AI/data/personal/.rag_faiss")
+# Worker threads for blocking calls (FAISS load/search, index builds, file walks);
+# sized so a long index load does not starve shell/search requests.
+TOOLS_THREAD_LIMIT = int(os.getenv("TOOLS_THREAD_LIMIT", "64"))
+# uvicorn worker processes (python tool_server.py). Each has its own app.state; the index
+# files are shared (mmapped), builds and saves are serialized by a file lock in
+# RAG_INDEX_DIR, and a worker reloads the index when another one has saved a newer one.
+TOOLS_WORKERS = int(os.getenv("TOOLS_WORKERS", "1"))
+# Processes for PDF parsing + splitting during index builds (pypdf is pure-Python, CPU-bound).
+RAG_LOAD_WORKERS = int(os.getenv("RAG_LOAD_WORKERS", str(os.cpu_count() or 1)))
+# Chunk embedding during builds: texts per Ollama /api/embed request, and requests in flight.
+RAG_EMBED_BATCH = int(os.getenv("RAG_EMBED_BATCH", "64"))
+RAG_EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+RAG_EMBED_TIMEOUT_S = float(os.getenv("RAG_EMBED_TIMEOUT_S", "120"))
+# HNSW graph index (sub-linear search) once the corpus outgrows an exact scan.
+# RAG_HNSW_M: neighbors per node (0 = always exact); RAG_HNSW_EF_SEARCH: search breadth
+# (higher = better recall, slower). Up to RAG_EXACT_MAX vectors are searched exactly.
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+RAG_EXACT_MAX = int(os.getenv("RAG_EXACT_MAX", "50000"))
+# Vector storage inside the HNSW index: "sq8" = 8-bit scalar quantization (4x smaller than
+# float32, trained on the build's vectors), "none" = full float32.
+RAG_INDEX_QUANT = os.getenv("RAG_INDEX_QUANT", "sq8").lower()
+# Load the saved index memory-mapped and read-only: vector pages are shared through the OS
+# page cache across uvicorn workers and only become resident when a search touches them.
+RAG_INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "1") == "1"
+# Query caches: exact-text LRU of query embeddings (RAG_QUERY_CACHE_SIZE, 0 = off), and an
+# opt-in near-duplicate query -> top-k docs cache (RAG_RESULT_CACHE_SIZE entries, reused at
+# cosine >= RAG_QUERY_CACHE_MIN_SIM; 0 = off, the default: a different query would get an
+# earlier query's results).
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+RAG_RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "0"))
+RAG_QUERY_CACHE_MIN_SIM = float(os.getenv("RAG_QUERY_CACHE_MIN_SIM", "0.98"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm everything before the first request: embeddings client + FAISS index live on
+    # app.state (one copy per worker), so no request pays cold-start or races the init.
+    # asyncio.to_thread (the handlers) runs on the loop's default executor; Starlette's own
+    # threadpool (e.g. sync streaming iterators) goes through anyio's limiter. Size both.
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = TOOLS_THREAD_LIMIT
+    executor = ThreadPoolExecutor(max_workers=TOOLS_THREAD_LIMIT, thread_name_prefix="tools")
+    asyncio.get_running_loop().set_default_executor(executor)
+    app.state.embeddings = await asyncio.to_thread(_get_embeddings)
+    app.state.vs = app.state.index_stamp = None
+    app.state.result_cache = _ResultCache(RAG_QUERY_CACHE_MIN_SIM, RAG_RESULT_CACHE_SIZE)
+    await _current_vs(app.state)   # load the saved index, if any
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False)
+
+if orjson is not None:
+    class ORJSONResp(JSONResponse):
+        media_type = "application/json"
 
-app = FastAPI(title="RAG Tool Server")
+        def render(self, content) -> bytes:
+            return orjson.dumps(content)
 
-_embeddings: Optional[OllamaEmbeddings] = None
-_vs: Optional[FAISS] = None
+    def _ndjson_line(obj) -> bytes:
+        return orjson.dumps(obj) + b"\n"
+else:
+    ORJSONResp = JSONResponse
+
+    def _ndjson_line(obj) -> bytes:
+        return (json.dumps(obj) + "\n").encode("utf-8")
+
+app = FastAPI(title="RAG Tool Server", lifespan=lifespan, default_response_class=ORJSONResp)
 
 class SearchRequest(BaseModel):
     query: str
@@ -33,6 +123,7 @@ class SearchRequest(BaseModel):
 
 class RefreshRequest(BaseModel):
     pdf_dir: str = ""
+    full: bool = False   # ignore the manifest and rebuild from scratch
 
 class ShellRequest(BaseModel):
     command: str
@@ -42,142 +133,532 @@ MAX_LOG_CHARS = int(os.getenv("API_LOG_PREVIEW", "500"))
 def _preview(val: str, limit: int = MAX_LOG_CHARS) -> str:
     if val is None:
         return ""
-    s = val.replace("\n", " ")
-    return (s[:limit] + ("..." if len(s) > limit else ""))
+    # Slice before replacing: bounded work however large val is.
+    return val[:limit].replace("\n", " ") + ("..." if len(val) > limit else "")
 
 def _log_tool_output(tool: str, rid: str, result: str):
-    log.info(f"[TOOL OUT {tool} {rid}] result_preview={_preview(result)} len={len(result)}")
+    if log.isEnabledFor(logging.INFO):
+        log.info("[TOOL OUT %s %s] result_preview=%s len=%d", tool, rid, _preview(result), len(result))
+
+_rng = random.Random()
+
+def _rid() -> str:
+    # Log correlation id: 8 hex chars from a non-crypto PRNG (no uuid4/os.urandom per request).
+    return f"{_rng.getrandbits(32):08x}"
+
+def _ms(t0: int) -> float:
+    # Milliseconds since t0 = time.perf_counter_ns() (monotonic; only converted when logged).
+    return (time.perf_counter_ns() - t0) / 1_000_000
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    rid = uuid.uuid4().hex[:8]
-    start = time.time()
-    try:
-        raw_body = await request.body()
-        body_text = raw_body.decode("utf-8", errors="replace") if raw_body else ""
-    except Exception as e:
-        body_text = f"<body read error: {e}>"
-    log.info(
-        f"[API IN] id={rid} method={request.method} path={request.url.path} "
-        f"query={dict(request.query_params)} body={_preview(body_text)}"
-    )
+    # The body is not read here (that would buffer every payload); handlers log their own
+    # inputs. Log lines are only formatted when INFO is enabled.
+    rid = _rid()
+    t0 = time.perf_counter_ns()
+    info = log.isEnabledFor(logging.INFO)
+    if info:
+        log.info("[API IN] id=%s method=%s path=%s query=%s bytes=%s", rid, request.method,
+                 request.url.path, request.url.query, request.headers.get("content-length", 0))
     try:
         response = await call_next(request)
-        elapsed = (time.time() - start) * 1000
-        log.info(
-            f"[API OUT] id={rid} status={response.status_code} ms={elapsed:.1f}"
-        )
+        if info:
+            log.info("[API OUT] id=%s status=%s ms=%.1f", rid, response.status_code, _ms(t0))
         return response
     except Exception as e:
-        elapsed = (time.time() - start) * 1000
-        log.exception(f"[API ERR] id={rid} ms={elapsed:.1f} error={e}")
+        log.exception("[API ERR] id=%s ms=%.1f error=%s", rid, _ms(t0), e)
         raise
 
-def _get_embeddings():
-    global _embeddings
-    if _embeddings is None:
-        t0 = time.time()
-        _embeddings = OllamaEmbeddings(model=OLLAMA_EMBED_MODEL)
-        log.info(f"[EMBED] model={OLLAMA_EMBED_MODEL} loaded ms={(time.time()-t0)*1000:.1f}")
-    return _embeddings
+class _CachedQueryEmbeddings(Embeddings):
+    # embed_query results kept in an LRU keyed on the exact query text (a repeated query
+    # skips the Ollama round-trip); embed_documents passes straight through.
+    def __init__(self, inner: Embeddings, size: int):
+        self.inner = inner
+        self.size = size
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            v = self._lru.get(text)
+            if v is not None:
+                self._lru.move_to_end(text)
+                return v
+        v = self.inner.embed_query(text)
+        if self.size > 0:
+            with self._lock:
+                self._lru[text] = v
+                while len(self._lru) > self.size:
+                    self._lru.popitem(last=False)
+        return v
+
+class _ResultCache:
+    # Near-duplicate queries reuse an earlier top-k instead of searching the main index.
+    # Keys live in a small inner-product index over normalized query vectors; when it
+    # reaches `size` entries it starts over. Cleared whenever the main index is replaced.
+    # An entry only serves requests for up to the k it was searched with; a larger-k
+    # search of a near-duplicate query replaces it instead of adding a shadowed row.
+    def __init__(self, min_sim: float, size: int):
+        self.min_sim = min_sim
+        self.size = size
+        self._lock = threading.Lock()
+        self._index = None
+        self._vals: List[Tuple[int, list]] = []   # (k searched, docs), by index row
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._vals = []
+
+    @staticmethod
+    def _vec(qv: List[float]):
+        v = np.asarray(qv, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(v)
+        return v
+
+    def get(self, qv: List[float], k: int) -> Optional[list]:
+        if self.size <= 0:
+            return None
+        v = self._vec(qv)
+        with self._lock:
+            if self._index is None or self._index.d != v.shape[1]:
+                return None
+            sims, rows = self._index.search(v, 1)
+            if rows[0][0] < 0 or sims[0][0] < self.min_sim:
+                return None
+            cached_k, docs = self._vals[rows[0][0]]
+        return docs[:k] if cached_k >= k else None
+
+    def put(self, qv: List[float], k: int, docs: list):
+        if self.size <= 0:
+            return
+        v = self._vec(qv)
+        with self._lock:
+            if self._index is not None and self._index.d == v.shape[1] and self._index.ntotal:
+                sims, rows = self._index.search(v, 1)
+                row = int(rows[0][0])
+                if row >= 0 and sims[0][0] >= self.min_sim:
+                    if self._vals[row][0] < k:
+                        self._vals[row] = (k, docs)
+                    return
+            if self._index is None or self._index.d != v.shape[1] or self._index.ntotal >= self.size:
+                self._index = faiss.IndexFlatIP(v.shape[1])
+                self._vals = []
+            self._index.add(v)
+            self._vals.append((k, docs))
+
+def _get_embeddings() -> Embeddings:
+    t0 = time.perf_counter_ns()
+    # One pooled keep-alive httpx client per process (via the ollama client), sized for the
+    # concurrent embedding batches, with a finite timeout (ollama's default is none).
+    client_kwargs = {
+        "limits": httpx.Limits(max_keepalive_connections=max(10, RAG_EMBED_CONCURRENCY), max_connections=20),
+        "timeout": RAG_EMBED_TIMEOUT_S,
+    }
+    embeddings = _CachedQueryEmbeddings(
+        OllamaEmbeddings(model=OLLAMA_EMBED_MODEL, client_kwargs=client_kwargs), RAG_QUERY_CACHE_SIZE
+    )
+    log.info("[EMBED] model=%s loaded ms=%.1f", OLLAMA_EMBED_MODEL, _ms(t0))
+    return embeddings
 
 def _index_path() -> Path:
     return Path(RAG_INDEX_DIR)
 
 def _save_vs(vs: FAISS):
+    # Same files as FAISS.save_local (index.faiss + index.pkl), written to temp names and
+    # renamed into place: the published index may be mmapped from index.faiss, and
+    # rewriting that file in place would truncate the pages under it.
     p = _index_path()
     p.mkdir(parents=True, exist_ok=True)
-    vs.save_local(str(p))
+    # Temp names are per process (workers may save concurrently); index.faiss is replaced
+    # last, since its stamp is what tells other workers to reload.
+    tmp = f".{os.getpid()}.tmp"
+    faiss.write_index(vs.index, str(p / f"index.faiss{tmp}"))
+    with open(p / f"index.pkl{tmp}", "wb") as f:
+        pickle.dump((vs.docstore, vs.index_to_docstore_id), f)
+    os.replace(p / f"index.pkl{tmp}", p / "index.pkl")
+    os.replace(p / f"index.faiss{tmp}", p / "index.faiss")
+
+_index_thread_lock = threading.Lock()
 
-def _load_vs() -> Optional[FAISS]:
-    global _vs
-    if _vs is not None:
-        return _vs
+@contextmanager
+def _index_lock(shared: bool = False):
+    # Exclusive: build + save + manifest (one writer across all workers). Shared: loading
+    # the saved files, so a reader never sees index.pkl and index.faiss from different
+    # saves. flock on RAG_INDEX_DIR/.lock; without fcntl, an in-process lock.
+    if fcntl is None:
+        with _index_thread_lock:
+            yield
+        return
     p = _index_path()
-    if not p.exists():
+    p.mkdir(parents=True, exist_ok=True)
+    with open(p / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _index_stamp() -> Optional[Tuple[int, int]]:
+    # Identity of the saved index file: changes on every save (new inode via os.replace).
+    try:
+        st = os.stat(_index_path() / "index.faiss")
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+def _read_index(path: str):
+    if RAG_INDEX_MMAP:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            log.info("[INDEX] mmap unavailable, reading into memory: %s", e)
+    return faiss.read_index(path)
+
+def _load_vs(embeddings: Embeddings) -> Optional[FAISS]:
+    p = _index_path()
+    if not (p / "index.faiss").exists():
         log.info("[INDEX] load skipped (path missing)")
         return None
     try:
-        t0 = time.time()
-        _vs = FAISS.load_local(str(p), _get_embeddings(), allow_dangerous_deserialization=True)
-        log.info(f"[INDEX] loaded ms={(time.time()-t0)*1000:.1f}")
+        t0 = time.perf_counter_ns()
+        index = _read_index(str(p / "index.faiss"))
+        with open(p / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        vs = FAISS(embedding_function=embeddings, index=index,
+                   docstore=docstore, index_to_docstore_id=index_to_docstore_id)
+        _tune_index(vs)
+        log.info("[INDEX] loaded type=%s ms=%.1f", type(vs.index).__name__, _ms(t0))
+        return vs
     except Exception as e:
-        log.warning(f"Load index failed: {e}")
-        _vs = None
-    return _vs
-
-def _build_index(pdf_dir: str) -> str:
-    global _vs
-    rid = uuid.uuid4().hex[:8]
-    t0 = time.time()
+        log.warning("Load index failed: %s", e)
+        return None
+
+def _tune_index(vs: FAISS):
+    # efSearch is a query-time knob: apply the configured value to built and loaded indexes.
+    hnsw = getattr(vs.index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = RAG_HNSW_EF_SEARCH
+
+def _embed_texts(embeddings: Embeddings, texts: List[str]):
+    # Fixed-size batches (one HTTP request each, batched server-side), a few in flight at
+    # once over the embeddings client's pooled connection; returns a float32 (n, d) matrix.
+    step = max(1, RAG_EMBED_BATCH)
+    batches = [texts[i:i + step] for i in range(0, len(texts), step)]
+    with ThreadPoolExecutor(max_workers=max(1, min(RAG_EMBED_CONCURRENCY, len(batches)))) as ex:
+        parts = list(ex.map(embeddings.embed_documents, batches))
+    return np.asarray([v for part in parts for v in part], dtype=np.float32)
+
+def _new_index(vectors):
+    # Empty (trained) index sized for `vectors`. Small corpora get an exact float32 scan
+    # (FAISS's SIMD flat kernels: no graph build, full recall, still fast at this size);
+    # larger ones an HNSW graph, sq8-quantized per RAG_INDEX_QUANT. L2 metric, matching
+    # langchain's FAISS wrapper default.
+    d = vectors.shape[1]
+    if RAG_HNSW_M <= 0 or len(vectors) <= RAG_EXACT_MAX:
+        return faiss.IndexFlatL2(d)
+    if RAG_INDEX_QUANT == "sq8":
+        index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_8bit, RAG_HNSW_M)
+        index.train(vectors)
+        return index
+    return faiss.IndexHNSWFlat(d, RAG_HNSW_M)
+
+def _reindex(vs: FAISS, kept: List[Tuple[int, str]]):
+    # Rebuild vs.index from its own stored vectors at positions `kept` (no re-embedding),
+    # renumbering the position -> docstore id map to match.
+    vectors = vs.index.reconstruct_n(0, vs.index.ntotal)[[pos for pos, _ in kept]]
+    vs.index = _new_index(vectors)
+    vs.index.add(vectors)
+    vs.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(kept)}
+    _tune_index(vs)
+
+def _needs_retrain(index, vectors) -> bool:
+    # An sq8 quantizer only encodes the per-dimension [min, max] range it was trained on;
+    # values outside it are clipped. Retrain when `vectors` leave that range or are a
+    # sizeable share (>= 25%) of the index, so the range reflects the whole corpus.
+    storage = getattr(index, "storage", None)
+    sq = getattr(faiss.downcast_index(storage), "sq", None) if storage is not None else None
+    if sq is None:
+        return False
+    if 4 * len(vectors) >= index.ntotal:
+        return True
+    trained = faiss.vector_to_array(sq.trained)
+    vmin, vdiff = trained[:index.d], trained[index.d:]
+    return bool((vectors < vmin).any() or (vectors > vmin + vdiff).any())
+
+def _add_chunks(vs: Optional[FAISS], chunks, ids: List[str], embeddings: Embeddings) -> FAISS:
+    # Embed `chunks` and add them under docstore `ids`; a new store when vs is None.
+    texts = [c.page_content for c in chunks]
+    metadatas = [c.metadata for c in chunks]
+    vectors = _embed_texts(embeddings, texts)
+    if vs is None:
+        vs = FAISS(embedding_function=embeddings, index=_new_index(vectors),
+                   docstore=InMemoryDocstore(), index_to_docstore_id={})
+    elif _needs_retrain(vs.index, vectors):
+        # Same positions, so index_to_docstore_id stays valid.
+        old = vs.index.reconstruct_n(0, vs.index.ntotal)
+        vs.index = _new_index(np.vstack([old, vectors]))
+        vs.index.add(old)
+    vs.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+    if RAG_HNSW_M > 0 and not hasattr(vs.index, "hnsw") and vs.index.ntotal > RAG_EXACT_MAX:
+        _reindex(vs, sorted(vs.index_to_docstore_id.items()))   # outgrew the exact scan
+    _tune_index(vs)
+    return vs
+
+def _copy_vs(vs: FAISS, embeddings: Embeddings) -> FAISS:
+    # Private copy to modify while in-flight searches keep using the published store.
+    return FAISS(embedding_function=embeddings, index=faiss.clone_index(vs.index),
+                 docstore=InMemoryDocstore(dict(vs.docstore._dict)),
+                 index_to_docstore_id=dict(vs.index_to_docstore_id))
+
+def _drop_ids(vs: FAISS, ids: List[str]) -> Optional[FAISS]:
+    # Remove docstore `ids`; returns None when nothing is left.
+    drop = set(ids)
+    if not hasattr(vs.index, "hnsw"):
+        vs.delete(ids=list(drop))
+        return vs if vs.index.ntotal else None
+    # HNSW graphs cannot remove nodes: rebuild from the surviving vectors instead.
+    kept = [(pos, doc_id) for pos, doc_id in sorted(vs.index_to_docstore_id.items()) if doc_id not in drop]
+    if not kept:
+        return None
+    _reindex(vs, kept)
+    vs.docstore.delete(list(drop))
+    return vs
+
+# --------------------------------------------------------------------------------------
+# Index manifest: path -> {mtime, size, sha1, ids (docstore ids of its chunks)}, written
+# next to the index so a refresh only re-embeds new/changed PDFs and drops removed ones.
+# --------------------------------------------------------------------------------------
+def _manifest_path() -> Path:
+    return _index_path() / "index_manifest.json"
+
+def _read_manifest() -> Dict[str, dict]:
+    try:
+        return json.loads(_manifest_path().read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def _write_manifest(manifest: Dict[str, dict]):
+    _manifest_path().write_text(json.dumps(manifest), encoding="utf-8")
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _find_pdfs(base: Path) -> List[str]:
+    # Sorted *.pdf paths under base. os.scandir reuses the directory entry's type info
+    # instead of building a Path (and stat-ing) per entry as rglob does.
+    found: List[str] = []
+    stack = [str(base)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".pdf") and entry.is_file():
+                    found.append(entry.path)
+    found.sort()
+    return found
+
+# Built once per process (pool workers included) rather than per PDF.
+_SPLITTER = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+
+def _load_one(path: str) -> Tuple[int, list]:
+    # Process-pool worker (top-level so it pickles): parse one PDF and split it here,
+    # so splitting parallelizes too. Returns (pages, chunks).
+    pages = PyPDFLoader(path).load()
+    return len(pages), _SPLITTER.split_documents(pages)
+
+def _load_pdfs(paths: List[str]) -> List[Tuple[int, list]]:
+    # (pages, chunks) per path, in path order.
+    if RAG_LOAD_WORKERS > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(RAG_LOAD_WORKERS, len(paths))) as ex:
+            return list(ex.map(_load_one, paths))
+    return [_load_one(p) for p in paths]
+
+def _build_index(pdf_dir: str, embeddings: Embeddings, current: Optional[FAISS] = None,
+                 full: bool = False) -> Tuple[str, Optional[FAISS]]:
+    # Returns (message, vector store or None); the caller publishes it on app.state.
+    # With `current` (the index the on-disk manifest describes) only new/changed PDFs are
+    # embedded and removed ones dropped, on a copy; otherwise, or with full=True, everything
+    # is rebuilt. A no-op refresh returns `current` untouched.
+    rid = _rid()
+    t0 = time.perf_counter_ns()
     pdf_dir = pdf_dir or RAG_PDF_DIR
     base = Path(pdf_dir).expanduser().resolve()
     if not base.exists():
-        log.warning(f"[BUILD {rid}] missing_dir path={base}")
-        return f"Error: PDF directory not found: {base}"
-    log.info(f"[BUILD {rid}] start dir={base}")
-    loader = DirectoryLoader(str(base), glob="**/*.pdf", loader_cls=PyPDFLoader, show_progress=True)
-    docs = loader.load()
-    if not docs:
-        log.info(f"[BUILD {rid}] no_pdfs ms={(time.time()-t0)*1000:.1f}")
-        return f"No PDFs found in {base}"
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    chunks = splitter.split_documents(docs)
-    print(chunks)
-    _vs = FAISS.from_documents(chunks, _get_embeddings())
-    _save_vs(_vs)
-    log.info(f"[BUILD {rid}] done docs={len(docs)} chunks={len(chunks)} ms={(time.time()-t0)*1000:.1f}")
-    return f"Indexed {len(chunks)} chunks from {len(docs)} PDF(s)."
+        log.warning("[BUILD %s] missing_dir path=%s", rid, base)
+        return f"Error: PDF directory not found: {base}", None
+    log.info("[BUILD %s] start dir=%s", rid, base)
+    paths = _find_pdfs(base)
+    old = {} if current is None or full else _read_manifest()
+    manifest: Dict[str, dict] = {}
+    changed: List[str] = []
+    for p in paths:
+        st = os.stat(p)
+        prev = old.get(p)
+        if prev and prev["mtime"] == st.st_mtime and prev["size"] == st.st_size:
+            manifest[p] = prev
+            continue
+        sha1 = _file_sha1(p)
+        if prev and prev["sha1"] == sha1:   # touched, same bytes: keep its chunks
+            manifest[p] = {**prev, "mtime": st.st_mtime, "size": st.st_size}
+            continue
+        manifest[p] = {"mtime": st.st_mtime, "size": st.st_size, "sha1": sha1, "ids": []}
+        changed.append(p)
+    redo = set(changed)
+    stale = [i for p, e in old.items() if p not in manifest or p in redo for i in e["ids"]]
+    if old and not changed and not stale:
+        if manifest != old:
+            _write_manifest(manifest)
+        log.info("[BUILD %s] up_to_date files=%d ms=%.1f", rid, len(paths), _ms(t0))
+        return f"Index up to date ({len(paths)} PDF(s) unchanged).", current
 
+    vs = _copy_vs(current, embeddings) if old else None
+    if vs is not None and stale:
+        vs = _drop_ids(vs, stale)
+    n_docs, chunks, ids = 0, [], []
+    for p, (pages, file_chunks) in zip(changed, _load_pdfs(changed)):
+        manifest[p]["ids"] = [uuid.uuid4().hex for _ in file_chunks]
+        n_docs += pages
+        chunks += file_chunks
+        ids += manifest[p]["ids"]
+    log.info("[BUILD %s] loaded files=%d/%d docs=%d chunks=%d dropped=%d ms=%.1f",
+             rid, len(changed), len(paths), n_docs, len(chunks), len(stale), _ms(t0))
+    if chunks:
+        log.debug("[BUILD %s] first chunk: %s", rid, chunks[0].page_content[:200])
+        vs = _add_chunks(vs, chunks, ids, embeddings)
+    if vs is None:
+        log.info("[BUILD %s] no_pdfs ms=%.1f", rid, _ms(t0))
+        return f"No PDFs found in {base}", None
+    # Manifest removed first: a crash mid-save leaves no manifest, forcing a full rebuild
+    # rather than trusting one that no longer matches the index.
+    _manifest_path().unlink(missing_ok=True)
+    _save_vs(vs)
+    _write_manifest(manifest)
+    log.info("[BUILD %s] done docs=%d chunks=%d ms=%.1f", rid, n_docs, len(chunks), _ms(t0))
+    msg = f"Indexed {len(chunks)} chunks from {n_docs} PDF(s)."
+    if old:
+        msg += f" {len(paths) - len(changed)} file(s) unchanged, {len(old.keys() - manifest.keys())} removed."
+    return msg, vs
+
+def _publish_vs(state, vs: FAISS, stamp=None):
+    # New index: cached top-k results point at the old one, so drop them.
+    state.vs = vs
+    state.index_stamp = stamp or _index_stamp()
+    state.result_cache.clear()
+
+def _reload_if_stale(state) -> Optional[FAISS]:
+    # Caller holds _index_lock: load the saved index if it differs from this worker's.
+    stamp = _index_stamp()
+    if stamp is not None and stamp != state.index_stamp:
+        vs = _load_vs(state.embeddings)
+        if vs is not None:
+            log.info("[INDEX] published from disk stamp=%s", stamp)
+            _publish_vs(state, vs, stamp)
+    return state.vs
+
+def _reload_shared(state) -> Optional[FAISS]:
+    with _index_lock(shared=True):
+        return _reload_if_stale(state)
+
+async def _current_vs(state) -> Optional[FAISS]:
+    # This worker's index, reloaded first if a newer one has been saved since (lock-free
+    # stamp check on the hot path; the load itself runs under the shared lock).
+    stamp = _index_stamp()
+    if stamp is not None and stamp != state.index_stamp:
+        return await asyncio.to_thread(_reload_shared, state)
+    return state.vs
+
+def _refresh(state, pdf_dir: str, full: bool = False, load_first: bool = False) -> Tuple[str, Optional[FAISS]]:
+    # Build under the exclusive lock, starting from the newest saved index (another worker
+    # may have refreshed while we waited). load_first: only build when nothing is saved.
+    with _index_lock():
+        current = _reload_if_stale(state)
+        if load_first and current is not None:
+            return "Index loaded.", current
+        result, vs = _build_index(pdf_dir, state.embeddings, current, full)
+        if vs is not None and vs is not state.vs:
+            _publish_vs(state, vs)
+    return result, vs
+
+# Handlers are async; anything blocking (FAISS, PDF parsing, filesystem walks,
+# subprocesses) is awaited off the event loop so concurrent requests keep flowing.
 @app.post("/rag/refresh")
-def rag_refresh(req: RefreshRequest):
-    rid = uuid.uuid4().hex[:8]
-    log.info(f"[REFRESH {rid}] payload={req.dict()}")
-    t0 = time.time()
-    result = _build_index(req.pdf_dir)
-    log.info(f"[REFRESH {rid}] result={_preview(result)} ms={(time.time()-t0)*1000:.1f}")
+async def rag_refresh(req: RefreshRequest, request: Request):
+    rid = _rid()
+    log.info("[REFRESH %s] payload=%s", rid, req)
+    t0 = time.perf_counter_ns()
+    result, _ = await asyncio.to_thread(_refresh, request.app.state, req.pdf_dir, req.full)
+    log.info("[REFRESH %s] result=%s ms=%.1f", rid, _preview(result), _ms(t0))
     _log_tool_output("rag_refresh", rid, result)
     return {"result": result}
 
 @app.get("/rag/list")
-def rag_list(folder: str = ""):
-    rid = uuid.uuid4().hex[:8]
-    t0 = time.time()
-    log.info(f"[LIST {rid}] folder_param={folder!r}")
+async def rag_list(folder: str = ""):
+    rid = _rid()
+    t0 = time.perf_counter_ns()
+    log.info("[LIST %s] folder_param=%r", rid, folder)
     base = Path(folder or RAG_PDF_DIR).expanduser().resolve()
     if not base.exists():
         msg = f"Error: folder not found: {base}"
-        log.warning(f"[LIST {rid}] missing folder={base}")
+        log.warning("[LIST %s] missing folder=%s", rid, base)
         _log_tool_output("rag_list_pdfs", rid, msg)
         return {"result": msg}
-    pdfs = sorted(str(p) for p in base.rglob("*.pdf"))
+    pdfs = await asyncio.to_thread(_find_pdfs, base)
     out = "\n".join(pdfs) if pdfs else "(no PDFs found)"
-    log.info(f"[LIST {rid}] count={len(pdfs)} ms={(time.time()-t0)*1000:.1f}")
+    log.info("[LIST %s] count=%d ms=%.1f", rid, len(pdfs), _ms(t0))
     _log_tool_output("rag_list_pdfs", rid, out)
     return {"result": out}
 
+NDJSON = "application/x-ndjson"
+
+def _ndjson(lines):
+    # One {"raw": line} object per line; the client builds its state as lines arrive.
+    return StreamingResponse((_ndjson_line({"raw": l}) for l in lines), media_type=NDJSON)
+
 @app.post("/rag/search")
-def rag_search(req: SearchRequest):
-    rid = uuid.uuid4().hex[:8]
-    t0 = time.time()
-    log.info(f"[SEARCH {rid}] query={req.query!r} k={req.k}")
-    vs = _load_vs()
+async def rag_search(req: SearchRequest, request: Request):
+    # Clients sending "Accept: application/x-ndjson" get one JSON object per hit line;
+    # everyone else keeps the {"result": "<lines>"} body.
+    stream = NDJSON in request.headers.get("accept", "")
+    rid = _rid()
+    t0 = time.perf_counter_ns()
+    log.info("[SEARCH %s] query=%r k=%d", rid, req.query, req.k)
+    state = request.app.state
+    vs = await _current_vs(state)
     if vs is None:
-        log.info(f"[SEARCH {rid}] no_index -> rebuild")
-        build_msg = _build_index(RAG_PDF_DIR)
-        vs = _load_vs()
+        # Another worker may be building (or have saved) it: wait for the lock, then load
+        # from disk, and only build when nothing is saved.
+        log.info("[SEARCH %s] no_index -> load or build", rid)
+        build_msg, vs = await asyncio.to_thread(_refresh, state, RAG_PDF_DIR, load_first=True)
         if vs is None:
             msg = f"No index. {build_msg}"
-            log.warning(f"[SEARCH {rid}] rebuild_failed")
+            log.warning("[SEARCH %s] rebuild_failed", rid)
             _log_tool_output("rag_search", rid, msg)
-            return {"result": msg}
-    retr = vs.as_retriever(search_kwargs={"k": req.k})
-    docs = retr.invoke(req.query)
+            return _ndjson(msg.splitlines()) if stream else {"result": msg}
+    qv = await asyncio.to_thread(state.embeddings.embed_query, req.query)
+    docs = state.result_cache.get(qv, req.k)
+    if docs is None:
+        docs = await asyncio.to_thread(vs.similarity_search_by_vector, qv, req.k)
+        state.result_cache.put(qv, req.k, docs)
+    else:
+        log.info("[SEARCH %s] result_cache hit", rid)
     if not docs:
         msg = "No relevant chunks found."
-        log.info(f"[SEARCH {rid}] no_hits ms={(time.time()-t0)*1000:.1f}")
+        log.info("[SEARCH %s] no_hits ms=%.1f", rid, _ms(t0))
         _log_tool_output("rag_search", rid, msg)
-        return {"result": msg}
+        return _ndjson([msg]) if stream else {"result": msg}
     lines: List[str] = []
     for i, d in enumerate(docs, 1):
         src = d.metadata.get("source", "?")
@@ -186,40 +667,67 @@ def rag_search(req: SearchRequest):
         if len(text) > 400:
             text = text[:400] + "..."
         lines.append(f"[{i}] {src}#p{page}: {text}")
+    log.info("[SEARCH %s] hits=%d ms=%.1f", rid, len(lines), _ms(t0))
+    if stream:
+        _log_tool_output("rag_search", rid, lines[0])  # first hit only; count logged above
+        return _ndjson(lines)
     result = "\n".join(lines)
-    log.info(f"[SEARCH {rid}] hits={len(lines)} ms={(time.time()-t0)*1000:.1f}")
     _log_tool_output("rag_search", rid, result)
     return {"result": result}
 
 @app.post("/shell")
-def shell_cmd(req: ShellRequest):
-    import subprocess
-    rid = uuid.uuid4().hex[:8]
-    t0 = time.time()
-    log.info(f"[SHELL {rid}] command={req.command!r}")
+async def shell_cmd(req: ShellRequest):
+    rid = _rid()
+    t0 = time.perf_counter_ns()
+    log.info("[SHELL %s] command=%r", rid, req.command)
     allowed = {"ls", "pwd", "df", "echo"}
-    parts = req.command.strip().split()
+    try:
+        parts = shlex.split(req.command)
+    except ValueError as e:
+        msg = f"Error: cannot parse command: {e}"
+        log.warning("[SHELL %s] parse_error=%s", rid, e)
+        _log_tool_output("shell_cmd", rid, msg)
+        return {"result": msg}
     if not parts:
         msg = "Error: empty command"
-        log.warning(f"[SHELL {rid}] empty")
+        log.warning("[SHELL %s] empty", rid)
         _log_tool_output("shell_cmd", rid, msg)
         return {"result": msg}
     if parts[0] not in allowed:
         msg = f"Error: command '{parts[0]}' not allowed"
-        log.warning(f"[SHELL {rid}] blocked cmd={parts[0]}")
+        log.warning("[SHELL %s] blocked cmd=%s", rid, parts[0])
         _log_tool_output("shell_cmd", rid, msg)
         return {"result": msg}
+    # Exec the argv directly (no /bin/sh): nothing after the checked command name can
+    # chain, redirect, or substitute another program.
+    proc = await asyncio.create_subprocess_exec(
+        *parts, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
     try:
-        proc = subprocess.run(req.command, shell=True, capture_output=True, text=True, check=True)
-        out = proc.stdout.strip() or "Command executed successfully."
-        log.info(f"[SHELL {rid}] ok rc=0 bytes={len(out)} ms={(time.time()-t0)*1000:.1f}")
-        _log_tool_output("shell_cmd", rid, out)
-        return {"result": out}
-    except subprocess.CalledProcessError as e:
-        msg = f"Error: rc={e.returncode} stderr={e.stderr.strip()}"
-        log.error(f"[SHELL {rid}] fail rc={e.returncode} stderr_len={len(e.stderr or '')} ms={(time.time()-t0)*1000:.1f}")
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), TOOLS_SHELL_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        msg = f"Error: timed out after {TOOLS_SHELL_TIMEOUT_S:g}s"
+        log.error("[SHELL %s] timeout ms=%.1f", rid, _ms(t0))
+        _log_tool_output("shell_cmd", rid, msg)
+        return {"result": msg}
+    if proc.returncode != 0:
+        err = stderr.decode("utf-8", errors="replace")
+        msg = f"Error: rc={proc.returncode} stderr={err.strip()}"
+        log.error("[SHELL %s] fail rc=%s stderr_len=%d ms=%.1f", rid, proc.returncode, len(err), _ms(t0))
         _log_tool_output("shell_cmd", rid, msg)
         return {"result": msg}
+    out = stdout.decode("utf-8", errors="replace").strip() or "Command executed successfully."
+    log.info("[SHELL %s] ok rc=0 bytes=%d ms=%.1f", rid, len(out), _ms(t0))
+    _log_tool_output("shell_cmd", rid, out)
+    return {"result": out}
 
 if __name__ == "__main__":
-    uvicorn.run("tool_server:app", host="0.0.0.0", port=int(os.getenv("TOOLS_PORT", "8000")))
\ No newline at end of file
+    # uvloop event loop + httptools parser (uvicorn[standard]) when installed; plain
+    # asyncio + h11 otherwise. Handlers are unaffected either way.
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    log.info("[SERVER] loop=%s http=%s workers=%d", loop, http, TOOLS_WORKERS)
+    uvicorn.run("tool_server:app", host="0.0.0.0", port=int(os.getenv("TOOLS_PORT", "8000")),
+                loop=loop, http=http, workers=TOOLS_WORKERS)
\ No newline at end of file